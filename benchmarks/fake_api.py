@@ -0,0 +1,182 @@
+"""
+Local stand-in for the disease.sh and World Bank endpoints used by
+extract.py, with configurable latency, error rate and country count.
+
+    python benchmarks/fake_api.py --countries 200 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+REAL_COUNTRIES = ["USA", "GBR", "DEU", "FRA", "ITA"]
+
+
+def make_countries(count):
+    """
+    Returns count country codes: the real example countries first, then
+    synthetic codes (X0001, X0002, ...).
+    """
+    codes = REAL_COUNTRIES[:count]
+    codes += [f"X{i:04d}" for i in range(1, count - len(codes) + 1)]
+    return codes
+
+
+def _seed(code):
+    return zlib.crc32(code.encode())
+
+
+def population(code):
+    return 1_000_000 + _seed(code) % 300_000_000
+
+
+def total_cases(code, day_index=0):
+    return population(code) // 4 + day_index * (_seed(code) % 5000)
+
+
+def total_vaccinations(code, day_index=0):
+    return population(code) * 2 + day_index * (_seed(code) % 20000)
+
+
+def _timeline_keys(lastdays):
+    today = date.today()
+    days = [today - timedelta(days=n) for n in range(lastdays - 1, -1, -1)]
+    return [f"{d.month}/{d.day}/{d.strftime('%y')}" for d in days]
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    # Set by make_server()
+    countries = set()
+    latency = 0.0
+    error_rate = 0.0
+    request_count = 0
+    count_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.count_lock:
+            type(self).request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self._send(503, {'message': 'Service Unavailable'})
+            return
+
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.strip('/').split('/')]
+        query = parse_qs(url.query)
+        lastdays = int(query.get('lastdays', ['30'])[0])
+
+        if parts[:3] == ['v3', 'covid-19', 'countries'] and len(parts) == 4:
+            self._countries(parts[3].split(','))
+        elif parts[:5] == ['v3', 'covid-19', 'vaccine', 'coverage', 'countries'] and len(parts) == 6:
+            self._vaccine(parts[5], lastdays)
+        elif parts[:3] == ['v3', 'covid-19', 'historical'] and len(parts) == 4:
+            self._historical(parts[3], lastdays)
+        elif parts[:2] == ['v2', 'country'] and len(parts) >= 5:
+            self._population(parts[2].split(';'))
+        else:
+            self._send(404, {'message': 'Not found'})
+
+    def _countries(self, codes):
+        records = [
+            {'country': code, 'countryInfo': {'iso3': code, 'iso2': code[:2]},
+             'continent': ['Europe', 'Asia', 'Africa', 'Americas'][_seed(code) % 4],
+             'cases': total_cases(code), 'deaths': total_cases(code) // 100}
+            for code in codes if code in self.countries
+        ]
+        if not records:
+            self._send(404, {'message': "Country not found or doesn't have any cases"})
+        elif len(codes) == 1:
+            self._send(200, records[0])
+        else:
+            self._send(200, records)
+
+    def _vaccine(self, code, lastdays):
+        if code not in self.countries:
+            self._send(404, {'message': 'No vaccine data for requested country'})
+            return
+        keys = _timeline_keys(lastdays)
+        self._send(200, {'country': code, 'timeline': {k: total_vaccinations(code, i) for i, k in enumerate(keys)}})
+
+    def _historical(self, code, lastdays):
+        if code not in self.countries:
+            self._send(404, {'message': "Country not found or doesn't have any historical data"})
+            return
+        keys = _timeline_keys(lastdays)
+        self._send(200, {'country': code, 'timeline': {
+            'cases': {k: total_cases(code, i) for i, k in enumerate(keys)},
+            'deaths': {k: total_cases(code, i) // 100 for i, k in enumerate(keys)},
+        }})
+
+    def _population(self, codes):
+        if not set(codes) <= self.countries:
+            # Like the World Bank API, one invalid code fails the whole request with a 200
+            self._send(200, [{'message': [{'id': '120', 'key': 'Invalid value',
+                                           'value': 'The provided parameter value is not valid'}]}])
+            return
+        records = [
+            {'countryiso3code': code, 'country': {'id': code[:2], 'value': code},
+             'date': '2022', 'value': population(code)}
+            for code in codes if code in self.countries
+        ]
+        self._send(200, [{'page': 1, 'pages': 1, 'total': len(records)}, records])
+
+
+def make_server(countries, latency=0.0, error_rate=0.0, host='127.0.0.1', port=0):
+    """
+    Creates (but does not start) a threaded fake API server serving the
+    given country codes. Port 0 picks a free port.
+    """
+    handler = type('Handler', (FakeApiHandler,), {
+        'countries': set(countries),
+        'latency': latency,
+        'error_rate': error_rate,
+        'request_count': 0,
+        'count_lock': threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_server(countries, latency=0.0, error_rate=0.0):
+    """
+    Starts a fake API server in a background thread.
+    Returns (server, base_url); call server.shutdown() when done.
+    """
+    server = make_server(countries, latency, error_rate)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake disease.sh / World Bank API")
+    parser.add_argument('--countries', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--port', type=int, default=8099)
+    args = parser.parse_args()
+
+    server = make_server(make_countries(args.countries), args.latency, args.error_rate, port=args.port)
+    print(f"Serving fake API on http://127.0.0.1:{args.port}")
+    print(f"  DISEASE_SH_URL=http://127.0.0.1:{args.port}/v3/covid-19")
+    print(f"  WORLD_BANK_URL=http://127.0.0.1:{args.port}/v2")
+    server.serve_forever()
@@ -0,0 +1,224 @@
+"""
+Offline benchmark suite for the pipeline and dashboard.
+
+Runs orchestrate_pipeline against the local fake API (benchmarks/fake_api.py),
+times each transform function, load_data_to_sqlite and update_dashboard on
+synthetic data, and writes a JSON report that can be compared with a
+previous one:
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --baseline bench.json --scales small,medium
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import extract  # noqa: E402
+import http_cache  # noqa: E402
+import http_client  # noqa: E402
+from fake_api import make_countries, population, start_server, total_cases, total_vaccinations  # noqa: E402
+from load import load_data_to_sqlite  # noqa: E402
+from orchestrator import orchestrate_pipeline  # noqa: E402
+from transform import final_transformation, transform_all, transform_covid_data, transform_vaccine_data  # noqa: E402
+
+# name: (number of countries, days of history in the synthetic data)
+SCALES = {
+    'small': (5, 30),
+    'medium': (200, 365),
+    'large': (10000, 730),
+}
+
+
+@contextlib.contextmanager
+def quiet():
+    # The pipeline logs its progress (to stderr), keep it out of the report
+    logging.disable(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def timed(fn, repeat):
+    """
+    Returns (best wall time in seconds over repeat runs, last result).
+    """
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with quiet():
+            result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4), result
+
+
+def synthetic_frames(countries, days):
+    """
+    Builds extract-shaped DataFrames with one row per (country, date).
+    """
+    dates = pd.date_range(end=pd.Timestamp.now().normalize(), periods=days).strftime('%Y-%m-%d')
+    country_col = np.repeat(countries, days)
+    date_col = np.tile(dates, len(countries))
+    day_index = np.tile(np.arange(days), len(countries))
+    cases = np.repeat([total_cases(c) for c in countries], days) + day_index * 100
+    vaccinations = np.repeat([total_vaccinations(c) for c in countries], days) + day_index * 1000
+
+    covid = pd.DataFrame({'country': country_col, 'total_confirmed': cases, 'total_deaths': cases // 100, 'date': date_col})
+    vaccine = pd.DataFrame({'country': country_col, 'total_vaccinations': vaccinations, 'date': date_col})
+    pop = pd.DataFrame({'country': countries, 'population': [population(c) for c in countries]})
+    return covid, vaccine, pop
+
+
+def bench_pipeline(countries, workdir, args):
+    server, base_url = start_server(countries, args.latency, args.error_rate)
+    extract.DISEASE_SH_URL = f"{base_url}/v3/covid-19"
+    extract.WORLD_BANK_POPULATION_URL = f"{base_url}/v2/country/{{}}/indicator/SP.POP.TOTL?format=json&date=2022&per_page=1000"
+    handler = server.RequestHandlerClass
+    best, requests = None, None
+    try:
+        for run in range(args.repeat):
+            # A fresh database per run, otherwise every run after the first
+            # only measures the no-change upsert path
+            db_file = os.path.join(workdir, f'pipeline-{run}.db')
+            handler.request_count = 0
+            started = time.perf_counter()
+            with quiet():
+                orchestrate_pipeline(countries, mode=args.pipeline_mode, backfill_days=args.backfill_days,
+                                     db_file=db_file, staging_dir=os.path.join(workdir, 'staging'))
+            elapsed = time.perf_counter() - started
+            if best is None or elapsed < best:
+                best, requests = elapsed, handler.request_count
+        # HTTP requests of the best run
+        return round(best, 4), requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_dashboard(db_file, repeat):
+    try:
+        import dashboard
+    except ImportError as e:
+        print(f"Skipping dashboard benchmarks: {e}")
+        return {}
+    dashboard.DB_FILE = db_file
+    dashboard._version_conn = None
+    dashboard._cache.update(version=None, outputs={})
+
+    results = {}
+    results['build_dashboard'], _ = timed(dashboard.build_dashboard, repeat)
+    timed(lambda: dashboard.update_dashboard(0), 1)  # warm the cache
+    results['update_dashboard_cached'], _ = timed(lambda: dashboard.update_dashboard(0), repeat)
+    return results
+
+
+def run_scale(name, args):
+    n_countries, days = SCALES[name]
+    countries = make_countries(n_countries)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if not args.skip_pipeline:
+            results['orchestrate_pipeline'], results['http_requests'] = bench_pipeline(countries, workdir, args)
+
+        covid, vaccine, pop = synthetic_frames(countries, days)
+        results['rows'] = len(covid)
+        results['transform_covid_data'], covid_t = timed(lambda: transform_covid_data(covid, pop), args.repeat)
+        results['transform_vaccine_data'], vaccine_t = timed(lambda: transform_vaccine_data(vaccine, pop), args.repeat)
+        results['final_transformation'], _ = timed(lambda: final_transformation(covid_t, vaccine_t), args.repeat)
+        results['transform_all'], final = timed(lambda: transform_all(covid, vaccine, pop), args.repeat)
+        results['transform_all_memory_bytes'] = int(final.memory_usage(deep=True).sum())
+
+        db_file = os.path.join(workdir, 'load.db')
+        results['load_data_to_sqlite'], _ = timed(lambda: load_data_to_sqlite(final, db_file=db_file), 1)
+        results['load_data_to_sqlite_unchanged'], _ = timed(lambda: load_data_to_sqlite(final, db_file=db_file), args.repeat)
+
+        results.update(bench_dashboard(db_file, args.repeat))
+    return results
+
+
+def compare(report, baseline, threshold):
+    """
+    Prints every timing next to its baseline. Returns the list of
+    (scale, benchmark, ratio) that got slower by more than threshold.
+    """
+    regressions = []
+    print(f"{'scale':<8} {'benchmark':<32} {'seconds':>10} {'baseline':>10} {'ratio':>7}")
+    for scale, results in report['results'].items():
+        for bench, value in results.items():
+            if bench in ('rows', 'http_requests', 'transform_all_memory_bytes'):
+                continue
+            base = baseline.get('results', {}).get(scale, {}).get(bench) if baseline else None
+            ratio = value / base if base else None
+            flag = ''
+            if ratio is not None and ratio > threshold:
+                regressions.append((scale, bench, ratio))
+                flag = '  <-- slower'
+            print(f"{scale:<8} {bench:<32} {value:>10.4f} {base if base is not None else '-':>10} "
+                  f"{f'{ratio:.2f}' if ratio is not None else '-':>7}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks")
+    parser.add_argument('--scales', default='small,medium,large', help=f"comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark, the best time is reported")
+    parser.add_argument('--latency', type=float, default=0.0, help="fake API latency per request in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of fake API requests failing with 503")
+    parser.add_argument('--pipeline-mode', choices=['snapshot', 'timeseries'], default='snapshot')
+    parser.add_argument('--backfill-days', type=int, default=30)
+    parser.add_argument('--skip-pipeline', action='store_true', help="only run the offline transform/load/dashboard benchmarks")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--baseline', help="JSON report to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2, help="ratio over baseline reported as a regression")
+    args = parser.parse_args()
+
+    # Measure the code, not the cache or the production rate limits
+    http_cache.CACHE_ENABLED = False
+    http_client.RATE_LIMITS['127.0.0.1'] = (1e9, 1e9)
+
+    report = {
+        'meta': {
+            'created_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'args': vars(args),
+        },
+        'results': {},
+    }
+    for name in args.scales.split(','):
+        print(f"Running {name} scale {SCALES[name]}...")
+        report['results'][name] = run_scale(name, args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than {args.threshold}x baseline")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import contextlib
+import os
+import shutil
+import time
+import uuid
+
+# Partition columns of the columnar dataset. One partition (and file) per
+# date keeps the file count low; country is an ordinary column, and writes
+# merge their rows into the partitions they touch.
+PARTITION_COLS = ['date']
+# Rows of a partition are identified by these columns when merging
+KEY_COLS = ['country', 'date']
+# Touched after every write, readers use its mtime as the data version
+VERSION_FILE = '_version'
+# Lock files: writers hold WRITE_LOCK for the whole read-merge-write cycle, and
+# SWAP_LOCK exclusively while partitions are swapped in; readers share SWAP_LOCK.
+# Names starting with '_' are skipped by dataset discovery.
+WRITE_LOCK = '_write.lock'
+SWAP_LOCK = '_swap.lock'
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+    except ImportError as e:
+        raise ImportError("The columnar store requires pyarrow (pip install pyarrow)") from e
+
+
+@contextlib.contextmanager
+def _locked(root_dir, name, shared=False):
+    """
+    Holds an advisory lock on root_dir/name, shared or exclusive. Works
+    across processes; Windows only has exclusive locks.
+    """
+    with open(os.path.join(root_dir, name), 'a+') as f:
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 seconds
+                    continue
+            try:
+                yield
+            finally:
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _partitioning(partition_cols):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([(col, pa.string()) for col in partition_cols]), flavor='hive')
+
+
+def _filesystem():
+    from pyarrow import fs
+    # Memory-map files so reads (zero-copy for uncompressed Arrow IPC) skip buffered I/O
+    return fs.LocalFileSystem(use_mmap=True)
+
+
+def _open(root_dir, file_format, partition_cols, use_mmap=True):
+    import pyarrow.dataset as ds
+    return ds.dataset(
+        root_dir,
+        format=file_format,
+        partitioning=_partitioning(partition_cols),
+        filesystem=_filesystem() if use_mmap else None,
+        exclude_invalid_files=True,
+    )
+
+
+def write_dataset(data, root_dir, file_format='parquet', partition_cols=PARTITION_COLS, key_cols=KEY_COLS):
+    """
+    Writes data as a hive-partitioned Parquet or Arrow IPC ('ipc') dataset.
+    Rows are merged into the partitions they fall in: existing rows with the
+    same key_cols are replaced, the other rows of those partitions are kept
+    and partitions not present in data are left untouched.
+    Concurrent writers, including other processes, are serialized, and the
+    merged partitions are written aside and swapped in so readers never see
+    a partially written partition.
+    """
+    _require_pyarrow()
+    os.makedirs(root_dir, exist_ok=True)
+    with _locked(root_dir, WRITE_LOCK):
+        _merge_partitions(data, root_dir, file_format, partition_cols, key_cols)
+
+
+def _merge_partitions(data, root_dir, file_format, partition_cols, key_cols):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    data = data.copy()
+    for col in set(partition_cols) | set(key_cols):
+        data[col] = data[col].astype(str)
+
+    if any(not name.startswith(('_', '.')) for name in os.listdir(root_dir)):
+        condition = None
+        for col in partition_cols:
+            expr = ds.field(col).isin(data[col].unique().tolist())
+            condition = expr if condition is None else condition & expr
+        # Not memory-mapped: the files are deleted below while the rows are kept
+        dataset = _open(root_dir, file_format, partition_cols, use_mmap=False)
+        existing = dataset.to_table(filter=condition).to_pandas()
+        if not existing.empty:
+            for col in set(partition_cols) | set(key_cols):
+                existing[col] = existing[col].astype(str)
+            replaced = existing.set_index(key_cols).index.isin(data.set_index(key_cols).index)
+            data = pd.concat([existing[~replaced], data], ignore_index=True)
+    data = data.sort_values(partition_cols + [c for c in key_cols if c not in partition_cols], ignore_index=True)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+
+    token = uuid.uuid4().hex
+    new_dir = os.path.join(root_dir, f'_new-{token}')
+    old_dir = os.path.join(root_dir, f'_old-{token}')
+    try:
+        ds.write_dataset(
+            table,
+            new_dir,
+            format=file_format,
+            partitioning=_partitioning(partition_cols),
+            basename_template=f'part-{{i}}.{"parquet" if file_format == "parquet" else "arrow"}',
+            # One partition per distinct date, e.g. a long backfill in one write
+            max_partitions=max(1024, len(data[partition_cols].drop_duplicates())),
+        )
+        partitions = [os.path.relpath(path, new_dir) for path, dirs, _ in os.walk(new_dir) if not dirs]
+        with _locked(root_dir, SWAP_LOCK):
+            for partition in partitions:
+                target = os.path.join(root_dir, partition)
+                if os.path.isdir(target):
+                    _move(target, os.path.join(old_dir, partition))
+                _move(os.path.join(new_dir, partition), target)
+            with open(os.path.join(root_dir, VERSION_FILE), 'w') as f:
+                f.write(str(time.time()))
+    finally:
+        shutil.rmtree(new_dir, ignore_errors=True)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _move(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.rename(source, target)
+
+
+def read_dataset(root_dir, columns=None, countries=None, start_date=None, end_date=None,
+                 file_format='parquet', partition_cols=PARTITION_COLS):
+    """
+    Reads the dataset back into a DataFrame, loading only the requested
+    columns and the partitions matching the country / date filters.
+    """
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    condition = None
+    if countries:
+        condition = ds.field('country').isin([str(c) for c in countries])
+    if start_date:
+        expr = ds.field('date') >= str(start_date)
+        condition = expr if condition is None else condition & expr
+    if end_date:
+        expr = ds.field('date') <= str(end_date)
+        condition = expr if condition is None else condition & expr
+
+    # Partitions are not swapped while the files are listed and read
+    with _locked(root_dir, SWAP_LOCK, shared=True):
+        dataset = _open(root_dir, file_format, partition_cols)
+        table = dataset.to_table(columns=columns, filter=condition)
+    return table.to_pandas()
+
+
+def get_version(root_dir):
+    """
+    Returns a token that changes whenever the dataset is written, or None.
+    It is a string: the nanosecond mtime exceeds 2**53 and would lose
+    precision as a JavaScript number, e.g. in a dcc.Store.
+    """
+    try:
+        return str(os.stat(os.path.join(root_dir, VERSION_FILE)).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+
+def latest_per_country(data):
+    """
+    Keeps the most recent row of each country.
+    """
+    if data.empty:
+        return data
+    return data.sort_values('date').drop_duplicates('country', keep='last')
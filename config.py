@@ -5,20 +5,17 @@ import logging
 import os
 from datetime import datetime
 
+import log_config
+
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('covid_pipeline.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 # Configuration
 WORKSPACE_DIR = os.path.dirname(os.path.abspath(__file__))
 PYTHON_PATH = "python"  # or "python3" depending on your system
+# 'in-process' runs the pipeline in this (warm) interpreter, 'subprocess'
+# starts a fresh orchestrator.py for every run
+RUN_MODE = os.environ.get('PIPELINE_RUN_MODE', 'in-process')
 
 # Pipeline files
 ORCHESTRATOR_SCRIPT = os.path.join(WORKSPACE_DIR, "orchestrator.py")
@@ -37,9 +34,19 @@ def run_orchestrator():
         if result.returncode == 0:
             logger.info("Orchestrator completed successfully")
         else:
-            logger.error(f"Orchestrator failed with error: {result.stderr}")
+            logger.error("Orchestrator failed with error: %s", result.stderr)
     except Exception as e:
-        logger.error(f"Error running orchestrator: {e}")
+        logger.error("Error running orchestrator: %s", e)
+
+def run_orchestrator_in_process():
+    """Run the data pipeline in this interpreter, reusing the loaded modules and HTTP session"""
+    try:
+        logger.info("Starting orchestrator in process...")
+        import orchestrator  # imported by the first run only
+        orchestrator.orchestrate_pipeline(orchestrator.COUNTRIES)
+        logger.info("Orchestrator completed successfully")
+    except Exception:
+        logger.exception("Orchestrator failed")
 
 def run_dashboard():
     """Run the dashboard"""
@@ -50,10 +57,10 @@ def run_dashboard():
             [PYTHON_PATH, DASHBOARD_SCRIPT],
             cwd=WORKSPACE_DIR
         )
-        logger.info(f"Dashboard started with PID: {process.pid}")
+        logger.info("Dashboard started with PID: %s", process.pid)
         return process
     except Exception as e:
-        logger.error(f"Error starting dashboard: {e}")
+        logger.error("Error starting dashboard: %s", e)
         return None
 
 def stop_dashboard(dashboard_process):
@@ -64,23 +71,24 @@ def stop_dashboard(dashboard_process):
             dashboard_process.wait(timeout=5)
             logger.info("Dashboard stopped successfully")
         except Exception as e:
-            logger.error(f"Error stopping dashboard: {e}")
+            logger.error("Error stopping dashboard: %s", e)
             dashboard_process.kill()
 
 def weekly_update():
-    """Perform weekly update of data and dashboard"""
+    """Perform weekly update of data without interrupting the dashboard"""
     logger.info("Starting weekly update...")
     
-    # Stop existing dashboard if running
+    # Make sure the dashboard is serving; it is never stopped for an update
     global dashboard_process
-    if 'dashboard_process' in globals() and dashboard_process:
-        stop_dashboard(dashboard_process)
-    
-    # Run orchestrator to update data
-    run_orchestrator()
+    if not ('dashboard_process' in globals() and dashboard_process and dashboard_process.poll() is None):
+        dashboard_process = run_dashboard()
     
-    # Start dashboard with new data
-    dashboard_process = run_dashboard()
+    # Run orchestrator to update data. The load is published atomically and
+    # the running dashboard picks up the new version on its next refresh.
+    if RUN_MODE == 'subprocess':
+        run_orchestrator()
+    else:
+        run_orchestrator_in_process()
     
     logger.info("Weekly update completed")
 
@@ -88,6 +96,11 @@ def weekly_update():
 schedule.every().monday.at("00:00").do(weekly_update)
 
 if __name__ == "__main__":
+    # The in-process pipeline, the dashboard and the log use paths relative
+    # to the workspace (covid_vaccine.db, staging/, http_cache.db), also when
+    # started from elsewhere, e.g. by cron or systemd
+    os.chdir(WORKSPACE_DIR)
+    log_config.setup_logging()
     logger.info("Starting COVID-19 pipeline scheduler...")
     
     # Run initial update
@@ -0,0 +1,135 @@
+import logging
+import os
+import pickle
+import shutil
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Checkpoints are written to <STAGING_DIR>/<run_id>/<task>.pkl
+STAGING_DIR = 'staging'
+# Fingerprint of the run arguments the checkpoints of a run belong to
+FINGERPRINT_FILE = '_fingerprint'
+
+
+class Task:
+    """
+    A pipeline stage: func is called with the outputs of deps, in order.
+    """
+
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+
+
+def _checkpoint_path(run_dir, name):
+    return os.path.join(run_dir, f'{name}.pkl')
+
+
+def _save_checkpoint(run_dir, name, output):
+    # Write then rename so a crash never leaves a truncated checkpoint
+    path = _checkpoint_path(run_dir, name)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _load_checkpoint(run_dir, name):
+    with open(_checkpoint_path(run_dir, name), 'rb') as f:
+        return pickle.load(f)
+
+
+def _check_fingerprint(run_dir, fingerprint):
+    """
+    Discards the checkpoints in run_dir if they were written by a run with
+    a different fingerprint, then records the current one.
+    """
+    path = os.path.join(run_dir, FINGERPRINT_FILE)
+    try:
+        with open(path) as f:
+            previous = f.read()
+    except FileNotFoundError:
+        previous = None
+    if previous is not None and previous != fingerprint:
+        logger.warning("Checkpoints in %s were written with different arguments, discarding them", run_dir)
+        shutil.rmtree(run_dir, ignore_errors=True)
+        os.makedirs(run_dir, exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(fingerprint)
+
+
+def _validate(tasks):
+    names = {task.name for task in tasks}
+    if len(names) != len(tasks):
+        raise ValueError("Task names must be unique")
+    for task in tasks:
+        missing = [dep for dep in task.deps if dep not in names]
+        if missing:
+            raise ValueError(f"Task {task.name} depends on unknown tasks: {missing}")
+
+
+def run_dag(tasks, run_id=None, staging_dir=STAGING_DIR, max_workers=4, keep_checkpoints=False, timings=None,
+            fingerprint=''):
+    """
+    Runs the tasks, starting each one as soon as its dependencies finished,
+    with up to max_workers tasks in parallel. Every task output is
+    checkpointed under staging_dir/run_id; running again with the same
+    run_id after a failure reuses the checkpoints and only runs the rest.
+    Checkpoints only apply to runs with the same fingerprint (a string
+    identifying the run arguments); others start from scratch.
+    Checkpoints are removed after a successful run unless keep_checkpoints.
+    If timings is a dict, it is filled with {task: {'wall_time_s', 'resumed'}}.
+    Returns ({task name: output}, run_id).
+    """
+    _validate(tasks)
+    run_id = run_id or uuid.uuid4().hex
+    run_dir = os.path.join(staging_dir, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    _check_fingerprint(run_dir, fingerprint)
+    timings = timings if timings is not None else {}
+
+    outputs = {}
+    for task in tasks:
+        if os.path.exists(_checkpoint_path(run_dir, task.name)):
+            outputs[task.name] = _load_checkpoint(run_dir, task.name)
+            timings[task.name] = {'wall_time_s': 0.0, 'resumed': True}
+            logger.info("Task %s resumed from checkpoint", task.name)
+
+    pending = [task for task in tasks if task.name not in outputs]
+
+    def execute(task):
+        started = time.perf_counter()
+        output = task.func(*[outputs[dep] for dep in task.deps])
+        _save_checkpoint(run_dir, task.name, output)
+        timings[task.name] = {'wall_time_s': round(time.perf_counter() - started, 4), 'resumed': False}
+        return output
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        running = {}
+        while pending or running:
+            for task in [t for t in pending if all(dep in outputs for dep in t.deps)]:
+                pending.remove(task)
+                running[executor.submit(execute, task)] = task
+            if not running:
+                raise ValueError(f"Dependency cycle between tasks: {[t.name for t in pending]}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    outputs[task.name] = future.result()
+                except Exception:
+                    logger.error("Task %s failed, resume with run_id=%s", task.name, run_id)
+                    for other in running:
+                        other.cancel()
+                    raise
+                logger.info("Task %s completed in %ss", task.name, timings[task.name]['wall_time_s'])
+
+    if not keep_checkpoints:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return outputs, run_id
@@ -1,32 +1,142 @@
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
-import plotly.express as px
-import plotly.graph_objects as go
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import pandas as pd
 import sqlite3
 import logging
+import os
+import threading
+
+import columnar_store
+import db
+import figures
+import log_config
+import queries
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
 
+DB_FILE = 'covid_vaccine.db'
+# 'sqlite' (default) or 'parquet' to read the columnar dataset in PARQUET_DIR
+DATA_BACKEND = os.environ.get('DASHBOARD_BACKEND', 'sqlite')
+PARQUET_DIR = os.environ.get('DASHBOARD_PARQUET_DIR', 'covid_parquet')
+# Columns the figures need, only these are read from the columnar dataset
+DASHBOARD_COLUMNS = ['country', 'date', 'total_cases', 'total_vaccinations', 'infection_rate', 'vaccination_rate', 'net_infection_rate']
+
+# Process-wide cache of the rendered dashboard per filter selection, shared
+# by every browser tab and only rebuilt when the database changes
+_cache = {'version': None, 'outputs': {}}
+_cache_lock = threading.Lock()
+# (version, filters) being built, set when done so concurrent requests for the
+# same view wait for it instead of building it again
+_building = {}
+_version_conn = None
+# Serializes use of _version_conn by the threaded server's callbacks
+_version_lock = threading.Lock()
+
+def get_data_version():
+    """
+    Returns the data version published by the pipeline, read through one
+    long-lived connection (a single-row primary key lookup). Callbacks run
+    on several threads, so the connection is used under _version_lock.
+    """
+    if DATA_BACKEND == 'parquet':
+        return columnar_store.get_version(PARQUET_DIR)
+    global _version_conn
+    with _version_lock:
+        if _version_conn is None:
+            _version_conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        try:
+            return db.read_data_version(_version_conn)
+        except sqlite3.OperationalError:
+            # Database not created by the pipeline yet
+            return None
+
+METRICS = queries.METRICS
+DEFAULT_TOP_N = queries.DEFAULT_TOP_N
+# Seconds between data version checks
+VERSION_CHECK_INTERVAL = 15
+
+def _region_countries(regions):
+    return queries.read_region_countries(DB_FILE, regions)
+
+def get_parquet_data(countries=None, regions=None, start_date=None, end_date=None, metric='net_infection_rate', top_n=None):
+    """
+    Latest row per country from the columnar dataset, reading only the
+    columns the dashboard uses and the partitions matching the filters.
+    """
+    if regions:
+        region_countries = _region_countries(regions)
+        countries = [c for c in countries if c in region_countries] if countries else region_countries
+        if not countries:
+            return pd.DataFrame(columns=DASHBOARD_COLUMNS)
+    df = columnar_store.read_dataset(PARQUET_DIR, columns=DASHBOARD_COLUMNS, countries=countries,
+                                     start_date=start_date, end_date=end_date)
+    df = columnar_store.latest_per_country(df).sort_values(metric, ascending=False)
+    if top_n:
+        df = df.head(top_n)
+    return df.reset_index(drop=True)
+
 # Function to get data from SQLite database
-def get_data():
+def get_data(countries=None, regions=None, start_date=None, end_date=None, metric='net_infection_rate', top_n=None):
+    """
+    Returns the latest row per country matching the filters, ordered by
+    metric and limited to the top_n rows. Filtering, ordering and the limit
+    run in SQL.
+    """
+    metric = metric if metric in METRICS else 'net_infection_rate'
     try:
-        conn = sqlite3.connect('covid_vaccine.db')
-        query = "SELECT * FROM covid_vaccine_data"
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        logger.info(f"Data retrieved successfully. Shape: {df.shape}")
+        if DATA_BACKEND == 'parquet':
+            df = get_parquet_data(countries, regions, start_date, end_date, metric, top_n)
+        else:
+            df = queries.read_latest(DB_FILE, countries, regions, start_date, end_date, metric, top_n)
+        logger.info("Data retrieved successfully. Shape: %s", df.shape)
         return df
     except Exception as e:
-        logger.error(f"Error retrieving data: {e}")
+        logger.error("Error retrieving data: %s", e)
         return pd.DataFrame()  # Return empty DataFrame if there's an error
 
+def get_totals(df, countries=None, regions=None, start_date=None, end_date=None):
+    """
+    Returns (total cases, total vaccinations) over every country matching
+    the filters (not only the top N shown). Unfiltered totals come from the
+    precomputed totals table.
+    """
+    if DATA_BACKEND != 'parquet':
+        try:
+            row = queries.read_totals(DB_FILE, countries, regions, start_date, end_date)
+            if row:
+                return row
+        except sqlite3.Error as e:
+            logger.error("Error retrieving totals: %s", e)
+    return df['total_cases'].sum(), df['total_vaccinations'].sum()
+
+def get_trend(countries=None, regions=None, start_date=None, end_date=None):
+    """
+    Daily totals over the selected countries and date range.
+    """
+    if DATA_BACKEND == 'parquet':
+        return get_parquet_trend(countries, regions, start_date, end_date)
+    return queries.read_trend(DB_FILE, countries, regions, start_date, end_date)
+
+def get_parquet_trend(countries=None, regions=None, start_date=None, end_date=None):
+    if regions:
+        region_countries = _region_countries(regions)
+        countries = [c for c in countries if c in region_countries] if countries else region_countries
+    df = columnar_store.read_dataset(PARQUET_DIR, columns=['date', 'total_cases', 'total_vaccinations'],
+                                     countries=countries, start_date=start_date, end_date=end_date)
+    return df.groupby('date', as_index=False)[['total_cases', 'total_vaccinations']].sum().sort_values('date')
+
+def get_filter_options():
+    """
+    Country and region choices plus the stored date range, for the controls.
+    """
+    return queries.read_filter_options(DB_FILE)
+
 # Layout of the dashboard
 app.layout = html.Div([
     html.H1("COVID-19 and Vaccination Dashboard", 
@@ -45,6 +155,31 @@ app.layout = html.Div([
         ], style={'width': '48%', 'display': 'inline-block', 'padding': '20px', 'boxShadow': '0 4px 8px 0 rgba(0,0,0,0.2)', 'backgroundColor': 'white', 'marginLeft': '4%'})
     ], style={'marginBottom': 30}),
     
+    # Filters, pushed down into the queries
+    html.Div([
+        html.Div([
+            html.Label("Countries"),
+            dcc.Dropdown(id='country-filter', multi=True, placeholder="All countries")
+        ], style={'width': '24%', 'display': 'inline-block', 'verticalAlign': 'top'}),
+        html.Div([
+            html.Label("Regions"),
+            dcc.Dropdown(id='region-filter', multi=True, placeholder="All regions")
+        ], style={'width': '18%', 'display': 'inline-block', 'verticalAlign': 'top', 'marginLeft': '2%'}),
+        html.Div([
+            html.Label("Date range"),
+            dcc.DatePickerRange(id='date-range')
+        ], style={'width': '26%', 'display': 'inline-block', 'verticalAlign': 'top', 'marginLeft': '2%'}),
+        html.Div([
+            html.Label("Top N by"),
+            dcc.Dropdown(id='metric', options=[{'label': v, 'value': k} for k, v in METRICS.items()],
+                         value='net_infection_rate', clearable=False)
+        ], style={'width': '16%', 'display': 'inline-block', 'verticalAlign': 'top', 'marginLeft': '2%'}),
+        html.Div([
+            html.Label("N"),
+            dcc.Input(id='top-n', type='number', min=1, value=DEFAULT_TOP_N, debounce=True, style={'width': '100%'})
+        ], style={'width': '8%', 'display': 'inline-block', 'verticalAlign': 'top', 'marginLeft': '2%'})
+    ], style={'marginBottom': 30, 'padding': '20px', 'backgroundColor': 'white', 'boxShadow': '0 4px 8px 0 rgba(0,0,0,0.2)'}),
+    
     # Second row with two graphs
     html.Div([
         html.Div([
@@ -61,76 +196,143 @@ app.layout = html.Div([
         dcc.Graph(id='net-infection-rate')
     ], style={'marginBottom': 30}),
     
-    # Update interval
+    # Fourth row with the trend over the selected date range
+    html.Div([
+        dcc.Graph(id='trend-chart')
+    ], style={'marginBottom': 30}),
+    
+    # Data version published by the pipeline; figures are only rebuilt and
+    # pushed to the browser when it changes
+    dcc.Store(id='data-version'),
     dcc.Interval(
         id='interval-component',
-        interval=300 * 1000,  # update every 5 minutes
+        interval=VERSION_CHECK_INTERVAL * 1000,
         n_intervals=0
     )
 ], style={'padding': '20px', 'backgroundColor': '#f0f2f5'})
 
+# Number of filter combinations kept per data version
+MAX_CACHED_VIEWS = 32
+# Filter key of the unfiltered view (see update_dashboard)
+DEFAULT_FILTERS = ((), (), None, None, 'net_infection_rate', DEFAULT_TOP_N)
+
+@app.callback(
+    Output('data-version', 'data'),
+    [Input('interval-component', 'n_intervals')],
+    [State('data-version', 'data')]
+)
+def check_data_version(n, current_version):
+    """
+    Cheap per-tick check: only updates the store, and thereby triggers the
+    dashboard callbacks, when the pipeline published a new version.
+    """
+    try:
+        version = get_data_version()
+    except sqlite3.Error as e:
+        logger.error("Error checking data version: %s", e)
+        raise PreventUpdate
+    if version is None or version == current_version:
+        raise PreventUpdate
+    return version
+
+@app.callback(
+    [Output('country-filter', 'options'),
+     Output('region-filter', 'options'),
+     Output('date-range', 'min_date_allowed'),
+     Output('date-range', 'max_date_allowed')],
+    [Input('data-version', 'data')]
+)
+def update_filter_options(n):
+    try:
+        countries, regions, min_date, max_date = get_filter_options()
+    except sqlite3.Error as e:
+        logger.error("Error retrieving filter options: %s", e)
+        return [], [], None, None
+    return ([{'label': c, 'value': c} for c in countries],
+            [{'label': r, 'value': r} for r in regions],
+            min_date, max_date)
+
 # Callbacks to update the dashboard
 @app.callback(
     [Output('total-cases', 'children'),
      Output('total-vaccinations', 'children'),
      Output('cases-vs-vaccinations', 'figure'),
      Output('vaccination-rate-chart', 'figure'),
-     Output('net-infection-rate', 'figure')],
-    [Input('interval-component', 'n_intervals')]
+     Output('net-infection-rate', 'figure'),
+     Output('trend-chart', 'figure')],
+    [Input('data-version', 'data'),
+     Input('country-filter', 'value'),
+     Input('region-filter', 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date'),
+     Input('metric', 'value'),
+     Input('top-n', 'value')]
 )
-def update_dashboard(n):
+def update_dashboard(data_version, countries=None, regions=None, start_date=None, end_date=None,
+                     metric='net_infection_rate', top_n=DEFAULT_TOP_N):
+    # Dates arrive as ISO datetimes from the picker, the table stores YYYY-MM-DD
+    filters = (tuple(sorted(countries or ())), tuple(sorted(regions or ())),
+               start_date[:10] if start_date else None, end_date[:10] if end_date else None,
+               metric or 'net_infection_rate', int(top_n) if top_n else None)
     try:
-        df = get_data()
+        version = get_data_version()
+    except sqlite3.Error as e:
+        logger.error("Error checking data version: %s", e)
+        version = None
+
+    # The lock only guards the cache lookups and stores; views are built
+    # outside it so a slow build does not hold up other viewers
+    key = (version, filters)
+    while version is not None:
+        with _cache_lock:
+            if _cache['version'] == version and filters in _cache['outputs']:
+                return _cache['outputs'][filters]
+            building = _building.get(key)
+            if building is None:
+                _building[key] = threading.Event()
+                break
+        building.wait()
+
+    try:
+        outputs = None
+        if filters == DEFAULT_FILTERS and version is not None and DATA_BACKEND != 'parquet':
+            # Unfiltered view prebuilt by the pipeline for this version
+            outputs = figures.load_prebuilt(DB_FILE, version)
+        if outputs is None:
+            outputs = build_dashboard(*filters)
+        if version is not None and outputs[0] != "N/A":
+            with _cache_lock:
+                if _cache['version'] != version or len(_cache['outputs']) >= MAX_CACHED_VIEWS:
+                    _cache['version'] = version
+                    _cache['outputs'] = {}
+                _cache['outputs'][filters] = outputs
+        return outputs
+    finally:
+        if version is not None:
+            with _cache_lock:
+                _building.pop(key).set()
+
+def build_dashboard(countries=(), regions=(), start_date=None, end_date=None,
+                    metric='net_infection_rate', top_n=DEFAULT_TOP_N):
+    """
+    Queries the data for the selected filters and builds the totals and
+    figures (as compact JSON dicts, so cached copies need no re-serialization
+    by Plotly).
+    """
+    countries, regions = list(countries), list(regions)
+    try:
+        df = get_data(countries, regions, start_date, end_date, metric, top_n)
         if df.empty:
             raise ValueError("No data available")
-            
-        # Calculate totals
-        total_cases = f"{int(df['total_cases'].sum()):,}"
-        total_vaccinations = f"{int(df['total_vaccinations'].sum()):,}"
-        
-        # Create cases vs vaccinations scatter plot
-        fig1 = px.scatter(df, x='total_cases', y='total_vaccinations', 
-                         text='country',  # Add country labels
-                         title='COVID-19 Cases vs Vaccinations by Country',
-                         labels={'total_cases': 'Total Cases', 
-                                'total_vaccinations': 'Total Vaccinations'})
-        fig1.update_traces(textposition='top center')
-        
-        # Create vaccination rate bar chart
-        fig2 = px.bar(df, x='country', y='vaccination_rate',
-                      title='Vaccination Rate by Country',
-                      labels={'vaccination_rate': 'Vaccination Rate (%)', 
-                             'country': 'Country'},
-                      color='vaccination_rate',
-                      color_continuous_scale='Viridis')
-        
-        # Create infection vs vaccination rate chart
-        fig3 = go.Figure()
-        fig3.add_trace(go.Bar(
-            x=df['country'],
-            y=df['infection_rate'],
-            name='Infection Rate',
-            marker_color='#ff7f7f'
-        ))
-        fig3.add_trace(go.Bar(
-            x=df['country'],
-            y=df['vaccination_rate'],
-            name='Vaccination Rate',
-            marker_color='#7fb3ff'
-        ))
-        fig3.update_layout(
-            barmode='group',
-            title='Infection Rate vs Vaccination Rate by Country',
-            yaxis_title='Rate (%)'
-        )
-        
-        return total_cases, total_vaccinations, fig1, fig2, fig3
+        totals = get_totals(df, countries, regions, start_date, end_date)
+        trend = get_trend(countries, regions, start_date, end_date)
+        return figures.build_outputs(df, totals, trend)
         
     except Exception as e:
-        logger.error(f"Error updating dashboard: {e}")
+        logger.error("Error updating dashboard: %s", e)
         # Return empty figures in case of error
-        empty_fig = go.Figure()
-        return "N/A", "N/A", empty_fig, empty_fig, empty_fig
+        return figures.empty_outputs()
 
 if __name__ == '__main__':
+    log_config.setup_logging()
     app.run_server(debug=True, port=8050)
\ No newline at end of file
@@ -1,27 +1,259 @@
+import logging
 import sqlite3
 
-def create_sqlite_db():
-    # Connect to SQLite database (it will create the database file if it doesn't exist)
-    conn = sqlite3.connect('covid_vaccine.db')
-    cursor = conn.cursor()
-
-    # Create table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS covid_vaccine_data (
-            country TEXT,
-            total_cases INTEGER,
-            total_deaths INTEGER,
-            infection_rate REAL,
-            total_vaccinations INTEGER,
-            vaccination_rate REAL,
-            net_infection_rate REAL
-        )
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Columns of the covid_vaccine_data table, (country, date) is the primary key
+KEY_COLUMNS = ['country', 'date']
+VALUE_COLUMNS = ['total_cases', 'total_deaths', 'infection_rate', 'total_vaccinations', 'vaccination_rate', 'net_infection_rate']
+COLUMNS = KEY_COLUMNS + VALUE_COLUMNS
+
+TABLE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        country TEXT NOT NULL,
+        date TEXT NOT NULL,
+        total_cases INTEGER,
+        total_deaths INTEGER,
+        infection_rate REAL,
+        total_vaccinations INTEGER,
+        vaccination_rate REAL,
+        net_infection_rate REAL,
+        PRIMARY KEY (country, date)
+    )
+'''
+
+# Secondary index for date-range scans, (country, date) is covered by the key
+INDEX_SCHEMA = '''
+    CREATE INDEX IF NOT EXISTS idx_{table}_date ON {table} (date)
+'''
+
+# Materialized summaries maintained by the loaders in the load transaction:
+# the latest row per country and the global totals over those rows
+LATEST_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table}_latest (
+        country TEXT PRIMARY KEY,
+        date TEXT NOT NULL,
+        total_cases INTEGER,
+        total_deaths INTEGER,
+        infection_rate REAL,
+        total_vaccinations INTEGER,
+        vaccination_rate REAL,
+        net_infection_rate REAL
+    )
+'''
+LATEST_INDEX_SCHEMA = '''
+    CREATE INDEX IF NOT EXISTS idx_{table}_latest_net_infection_rate ON {table}_latest (net_infection_rate DESC)
+'''
+TOTALS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table}_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_cases INTEGER,
+        total_vaccinations INTEGER,
+        countries INTEGER,
+        latest_date TEXT,
+        updated_at TEXT
+    )
+'''
+
+# Region (continent) of each country, used to filter the dashboard
+REGIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS country_regions (
+        country TEXT PRIMARY KEY,
+        continent TEXT
+    )
+'''
+
+# Single-row version stamp, bumped by every load that changes data
+VERSION_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL,
+        updated_at TEXT
+    )
+'''
+
+# Dashboard outputs prebuilt by the pipeline, tagged with their data version
+FIGURES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS dashboard_figures (
+        view TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        payload TEXT NOT NULL,
+        built_at TEXT
+    )
+'''
+
+# Last date loaded per pipeline mode and country. Timeseries runs resume from
+# their own mark, so snapshot loads into the same table do not move it
+HIGH_WATER_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS high_water_marks (
+        mode TEXT NOT NULL,
+        country TEXT NOT NULL,
+        date TEXT NOT NULL,
+        updated_at TEXT,
+        PRIMARY KEY (mode, country)
+    )
+'''
+
+RUNS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS pipeline_runs (
+        run_id TEXT PRIMARY KEY,
+        started_at TEXT,
+        status TEXT,
+        duration_s REAL,
+        metrics TEXT
+    )
+'''
+
+
+def connect(db_file='covid_vaccine.db'):
+    """
+    Opens a connection in WAL mode so dashboard readers are not blocked
+    while the pipeline writes.
+    """
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def ensure_schema(conn, table_name='covid_vaccine_data', staging=False):
+    """
+    Creates the data table if needed. A table from before the (country, date)
+    key was introduced is kept aside as <table_name>_legacy.
+    Unless staging is set, also creates the indexes and summary tables,
+    populating the summaries from existing data the first time. The
+    summaries are created and populated in the caller's open transaction,
+    or else in one that is committed here.
+    """
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table_name})')]
+    if columns and 'date' not in columns:
+        conn.execute(f'ALTER TABLE {table_name} RENAME TO {table_name}_legacy')
+        logger.warning("Existing %s has no date column, moved to %s_legacy.", table_name, table_name)
+    conn.execute(TABLE_SCHEMA.format(table=table_name))
+    if staging:
+        return
+
+    conn.execute(INDEX_SCHEMA.format(table=table_name))
+    conn.execute(REGIONS_SCHEMA)
+    conn.execute(VERSION_SCHEMA)
+    conn.execute(FIGURES_SCHEMA)
+    conn.execute(HIGH_WATER_SCHEMA)
+    owns_transaction = not conn.in_transaction
+    if owns_transaction:
+        conn.execute('BEGIN')
+    try:
+        conn.execute(LATEST_SCHEMA.format(table=table_name))
+        conn.execute(LATEST_INDEX_SCHEMA.format(table=table_name))
+        conn.execute(TOTALS_SCHEMA.format(table=table_name))
+        # Every refresh writes the totals row, so without it the summaries
+        # were never populated
+        if not conn.execute(f'SELECT 1 FROM {table_name}_totals WHERE id = 1').fetchone():
+            refresh_summaries(conn, table_name)
+        if owns_transaction:
+            conn.commit()
+    except Exception:
+        if owns_transaction:
+            conn.rollback()
+        raise
+
+
+def refresh_summaries(conn, table_name='covid_vaccine_data', countries_table=None):
+    """
+    Refreshes the <table_name>_latest and <table_name>_totals summaries.
+    With countries_table (a table with a country column, e.g. the load
+    staging table) only those countries' latest rows are recomputed.
+    Runs inside the caller's transaction.
+    """
+    columns = ', '.join(f'd.{c}' for c in COLUMNS)
+    scope = f'WHERE country IN (SELECT country FROM {countries_table})' if countries_table else ''
+    conn.execute(f'DELETE FROM {table_name}_latest {scope}')
+    conn.execute(f'''
+        INSERT INTO {table_name}_latest ({', '.join(COLUMNS)})
+        SELECT {columns} FROM {table_name} d
+        JOIN (SELECT country, MAX(date) AS date FROM {table_name} {scope} GROUP BY country) latest
+          ON latest.country = d.country AND latest.date = d.date
+    ''')
+    conn.execute(f'''
+        INSERT OR REPLACE INTO {table_name}_totals (id, total_cases, total_vaccinations, countries, latest_date, updated_at)
+        SELECT 1, COALESCE(SUM(total_cases), 0), COALESCE(SUM(total_vaccinations), 0), COUNT(*), MAX(date), datetime('now')
+        FROM {table_name}_latest
     ''')
 
+
+def bump_data_version(conn):
+    """
+    Publishes a new data version. Call inside the load transaction so the
+    version changes exactly when the new data becomes visible.
+    """
+    conn.execute('''
+        INSERT INTO data_version (id, version, updated_at) VALUES (1, 1, datetime('now'))
+        ON CONFLICT (id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+    ''')
+
+
+def read_data_version(conn):
+    """
+    Returns the current data version, 0 before the first load.
+    """
+    row = conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()
+    return row[0] if row else 0
+
+
+def ensure_runs_table(conn):
+    """
+    Creates the pipeline_runs metrics table if needed.
+    """
+    conn.execute(RUNS_SCHEMA)
+
+
+def get_high_water_marks(db_file='covid_vaccine.db', mode='timeseries', table_name='covid_vaccine_data'):
+    """
+    Returns {country: last date loaded by mode (YYYY-MM-DD)}.
+    """
+    conn = connect(db_file)
+    try:
+        ensure_schema(conn, table_name)
+        return dict(conn.execute('SELECT country, date FROM high_water_marks WHERE mode = ?', (mode,)).fetchall())
+    finally:
+        conn.close()
+
+
+def set_high_water_marks(marks, db_file='covid_vaccine.db', mode='timeseries', table_name='covid_vaccine_data'):
+    """
+    Advances the high-water marks of mode to {country: date}. A mark is
+    never moved back.
+    """
+    conn = connect(db_file)
+    try:
+        ensure_schema(conn, table_name)
+        with conn:
+            conn.executemany('''
+                INSERT INTO high_water_marks (mode, country, date, updated_at) VALUES (?, ?, ?, datetime('now'))
+                ON CONFLICT (mode, country) DO UPDATE
+                SET date = MAX(high_water_marks.date, excluded.date), updated_at = excluded.updated_at
+            ''', [(mode, country, marks[country]) for country in marks])
+    finally:
+        conn.close()
+
+
+def create_sqlite_db(db_file='covid_vaccine.db', table_name='covid_vaccine_data'):
+    # Connect to SQLite database (it will create the database file if it doesn't exist)
+    conn = connect(db_file)
+
+    # Create tables
+    ensure_schema(conn, table_name)
+    ensure_runs_table(conn)
+
     # Commit changes and close the connection
     conn.commit()
     conn.close()
-    print("Database and table created successfully.")
+    logger.info("Database and table created successfully.")
+
+
+if __name__ == '__main__':
+    import log_config
+    log_config.setup_logging()
 
-# Call the function to create the database and table
-create_sqlite_db()
+    # Create the database and table
+    create_sqlite_db()
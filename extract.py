@@ -1,99 +1,374 @@
-import requests
-import pandas as pd
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import http_client
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
 countries_list = [
     "USA"]
+
+# Maximum number of requests in flight at once when fetching concurrently
+MAX_WORKERS = 16
+
+# Number of countries packed into a single disease.sh / World Bank request
+BATCH_SIZE = 50
+
+# API base URLs, overridable e.g. to point at the local stand-in in benchmarks/
+DISEASE_SH_URL = os.environ.get('DISEASE_SH_URL', "https://disease.sh/v3/covid-19")
+WORLD_BANK_URL = os.environ.get('WORLD_BANK_URL', "http://api.worldbank.org/v2")
+# World Bank population data API (Indicator: SP.POP.TOTL - Total Population)
+WORLD_BANK_POPULATION_URL = WORLD_BANK_URL + "/country/{}/indicator/SP.POP.TOTL?format=json&date=2022&per_page=1000"
+
+
+def _frame(rows):
+    # pandas is imported on first use, so importing this module stays cheap
+    import pandas as pd
+    return pd.DataFrame(rows)
+
+
+def _chunks(countries, batch_size):
+    """
+    Splits the country list into consecutive batches of at most batch_size.
+    """
+    batch_size = max(1, batch_size or 1)
+    return [countries[i:i + batch_size] for i in range(0, len(countries), batch_size)]
+
+
+def _map_batches(fetch_batch, countries, batch_size, max_workers, executor=None):
+    """
+    Applies fetch_batch to every batch of countries, optionally through a
+    bounded thread pool, and flattens the returned rows. Rows keep the order
+    of the input list. A given executor is used instead of a new pool, so
+    concurrent fetches can share one bound on requests in flight.
+    """
+    batches = _chunks(list(countries), batch_size)
+    if executor is not None:
+        results = list(executor.map(fetch_batch, batches))
+    elif max_workers and max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(fetch_batch, batches))
+    else:
+        results = [fetch_batch(batch) for batch in batches]
+    return [row for rows in results for row in rows]
+
+
+def _split_by_country(batch, records, keys_of):
+    """
+    Matches the records of a batched response back to the requested country
+    codes. keys_of returns the identifiers (ISO2/ISO3/name) of a record.
+    Returns a list of (country, record) pairs in batch order.
+    """
+    by_key = {}
+    for record in records:
+        for key in keys_of(record):
+            if key:
+                by_key.setdefault(str(key).upper(), record)
+    return [(country, by_key[country.upper()]) for country in batch if country.upper() in by_key]
+
+
+def _disease_sh_keys(record):
+    info = record.get('countryInfo') or {}
+    return [info.get('iso3'), info.get('iso2'), record.get('country')]
+
+
+def _fetch_covid_batch(batch):
+    # Using disease.sh API which accepts comma-separated country lists
+    api_url = f"{DISEASE_SH_URL}/countries/{','.join(batch)}"
+    response = http_client.get(api_url)
+
+    if response.status_code != 200:
+        if len(batch) > 1:
+            # One unknown code can fail the whole batch, retry countries one by one
+            logger.warning("Batched COVID request failed (%s), retrying %d countries individually",
+                           response.status_code, len(batch))
+            return [row for country in batch for row in _fetch_covid_batch([country])]
+        logger.warning("Failed to fetch data for %s: %s", batch[0], response.status_code)
+        return []
+
+    data = response.json()
+    # A single country comes back as an object, several as a list
+    records = data if isinstance(data, list) else [data]
+    if len(batch) == 1:
+        matched = [(batch[0], records[0])] if records else []
+    else:
+        matched = _split_by_country(batch, records, _disease_sh_keys)
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    rows = []
+    for country, record in matched:
+        rows.append({
+            'country': country,
+            'total_confirmed': record.get('cases', 0),
+            'total_deaths': record.get('deaths', 0),
+            'continent': record.get('continent'),
+            'date': today
+        })
+    logger.debug("Fetched COVID data for %d/%d countries", len(rows), len(batch))
+    return rows
+
+
 # Function to fetch COVID-19 data from the JHU CSSE dataset via the disease.sh API
-def fetch_covid_data(countries):
+def fetch_covid_data(countries, max_workers=None, batch_size=BATCH_SIZE, executor=None):
     """
     Fetches COVID-19 data from the JHU CSSE dataset via the disease.sh API.
+    Countries are requested in batches of batch_size.
     Returns a cleaned and formatted DataFrame.
     """
-    covid_data_list = []
-    
-    for country in countries:
-        # Using disease.sh API which provides historical data
-        api_url = f"https://disease.sh/v3/covid-19/countries/{country}"
-        response = requests.get(api_url)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            country_data = {
-                'country': country,
-                'total_confirmed': data.get('cases', 0),
-                'total_deaths': data.get('deaths', 0),
-                'date': pd.Timestamp.now().strftime('%Y-%m-%d')
-            }
-            covid_data_list.append(country_data)
-            print(f"Successfully fetched COVID data for {country}")
-        else:
-            print(f"Failed to fetch data for {country}: {response.status_code}")
-    
+    covid_data_list = _map_batches(_fetch_covid_batch, countries, batch_size, max_workers, executor)
+
     # Convert list of data into DataFrame
-    covid_data = pd.DataFrame(covid_data_list)
-    
-    print("COVID-19 data fetched and cleaned successfully.")
+    covid_data = _frame(covid_data_list)
+
+    logger.info("COVID-19 data fetched and cleaned successfully.")
     return covid_data
 
 
-def fetch_population_data(countries):
-    """
-    Fetches population data from the World Bank API.
-    Returns a cleaned and formatted DataFrame.
-    """
-    # World Bank population data API (Indicator: SP.POP.TOTL - Total Population)
-    population_url = "http://api.worldbank.org/v2/country/{}/indicator/SP.POP.TOTL?format=json&date=2022"
+def _world_bank_keys(record):
+    return [record.get('countryiso3code'), (record.get('country') or {}).get('id')]
 
-    # Initialize an empty list to store the population data
-    countries_population = []
 
-    # Loop through the list of countries to fetch the population for each
-    for country in countries:
-        # Construct the URL for each country by using its ISO code
-        country_url = population_url.format(country)
-        response = requests.get(country_url)
+def _world_bank_error(data):
+    # Error bodies are a single element list holding a message list
+    if data and isinstance(data[0], dict) and 'message' in data[0]:
+        return '; '.join(str(message.get('value', message)) for message in data[0]['message'])
+    return None
 
-        # Check if the response is valid
-        if response.status_code == 200:
-            data = response.json()
-            if len(data) > 1 and 'value' in data[1][0]:  # Ensure the data exists
-                population = data[1][0]['value']
-                countries_population.append({'country': country, 'population': population})
 
-    # Convert list to DataFrame
-    population_data = pd.DataFrame(countries_population)
+def _fetch_population_batch(batch):
+    # The World Bank API accepts semicolon-separated country lists
+    country_url = WORLD_BANK_POPULATION_URL.format(';'.join(batch))
+    response = http_client.get(country_url)
 
-    print(f"Population data fetched for {len(population_data)} countries.")
-    return population_data
+    # Check if the response is valid. An invalid country code is reported as
+    # a 200 with a [{"message": [...]}] body that fails the whole batch.
+    data = response.json() if response.status_code == 200 else None
+    error = response.status_code if data is None else _world_bank_error(data)
+    if error:
+        if len(batch) > 1:
+            logger.warning("Batched population request failed (%s), retrying %d countries individually",
+                           error, len(batch))
+            return [row for country in batch for row in _fetch_population_batch([country])]
+        logger.warning("Failed to fetch population data for %s: %s", batch[0], error)
+        return []
+
+    if len(data) < 2 or not data[1]:  # Ensure the data exists
+        return []
+
+    rows = []
+    for country, record in _split_by_country(batch, data[1], _world_bank_keys):
+        if 'value' in record:
+            rows.append({'country': country, 'population': record['value']})
+    return rows
 
-def fetch_vaccination_data(countries):
+
+def fetch_population_data(countries, max_workers=None, batch_size=BATCH_SIZE, executor=None):
     """
-    Fetches vaccination data from the disease.sh API.
+    Fetches population data from the World Bank API.
+    Countries are requested in batches of batch_size.
     Returns a cleaned and formatted DataFrame.
     """
-    vaccination_data_list = []
-    
-    for country in countries:
-        api_url = f"https://disease.sh/v3/covid-19/vaccine/coverage/countries/{country}?lastdays=1"
-        response = requests.get(api_url)
-        
+    countries_population = _map_batches(_fetch_population_batch, countries, batch_size, max_workers, executor)
+
+    # Convert list to DataFrame
+    population_data = _frame(countries_population)
+
+    logger.info("Population data fetched for %d countries.", len(population_data))
+    return population_data
+
+
+def _fetch_vaccination_batch(batch):
+    # The vaccine coverage endpoint only accepts one country per request
+    rows = []
+    for country in batch:
+        api_url = f"{DISEASE_SH_URL}/vaccine/coverage/countries/{country}?lastdays=1"
+        response = http_client.get(api_url)
+
         if response.status_code == 200:
             data = response.json()
             timeline = data.get('timeline', {})
             # Get the last date's vaccination data
             last_date = list(timeline.keys())[-1] if timeline else None
             total_vaccinations = timeline[last_date] if last_date else 0
-            
-            vaccination_data_list.append({
+
+            rows.append({
                 'country': country,
                 'total_vaccinations': total_vaccinations
             })
-            print(f"Successfully fetched vaccination data for {country}")
+            logger.debug("Fetched vaccination data for %s", country)
         else:
-            print(f"Failed to fetch vaccination data for {country}: {response.status_code}")
-    
+            logger.warning("Failed to fetch vaccination data for %s: %s", country, response.status_code)
+    return rows
+
+
+def fetch_vaccination_data(countries, max_workers=None, executor=None):
+    """
+    Fetches vaccination data from the disease.sh API.
+    Returns a cleaned and formatted DataFrame.
+    """
+    vaccination_data_list = _map_batches(_fetch_vaccination_batch, countries, 1, max_workers, executor)
+
     # Convert to DataFrame
-    vaccination_data = pd.DataFrame(vaccination_data_list)
-    
-    print("Vaccination data fetched and cleaned successfully.")
+    vaccination_data = _frame(vaccination_data_list)
+
+    logger.info("Vaccination data fetched and cleaned successfully.")
     return vaccination_data
+
+
+def fetch_all_data(countries, max_workers=MAX_WORKERS, batch_size=BATCH_SIZE):
+    """
+    Fetches COVID-19, vaccination and population data for all countries
+    concurrently. The three sources share one bounded thread pool, so at
+    most max_workers requests are in flight at any time. COVID and
+    population requests are batched batch_size countries at a time.
+    Returns (covid_data, vaccine_data, population_data) DataFrames identical
+    to those of the individual fetch_* functions.
+    """
+    countries = list(countries)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        covid_futures = [executor.submit(_fetch_covid_batch, b) for b in _chunks(countries, batch_size)]
+        vaccine_futures = [executor.submit(_fetch_vaccination_batch, b) for b in _chunks(countries, 1)]
+        population_futures = [executor.submit(_fetch_population_batch, b) for b in _chunks(countries, batch_size)]
+
+        covid_rows = [row for f in covid_futures for row in f.result()]
+        vaccine_rows = [row for f in vaccine_futures for row in f.result()]
+        population_rows = [row for f in population_futures for row in f.result()]
+
+    covid_data = _frame(covid_rows)
+    vaccine_data = _frame(vaccine_rows)
+    population_data = _frame(population_rows)
+
+    logger.info("Fetched data concurrently for %d countries (max_workers=%d, batch_size=%d).",
+                len(countries), max_workers, batch_size)
+    return covid_data, vaccine_data, population_data
+
+
+# Default number of days fetched for a country with no stored history
+BACKFILL_DAYS = 90
+
+
+def _days_for(country, lastdays):
+    """
+    lastdays is either a single day count or a {country: days} mapping.
+    """
+    if isinstance(lastdays, dict):
+        return lastdays.get(country, BACKFILL_DAYS)
+    return lastdays
+
+
+def _timeline_dates(timeline):
+    # disease.sh timelines are keyed by m/d/yy dates
+    return [datetime.strptime(key, '%m/%d/%y').strftime('%Y-%m-%d') for key in timeline]
+
+
+def _fetch_covid_history_country(country, lastdays):
+    api_url = f"{DISEASE_SH_URL}/historical/{country}?lastdays={lastdays}"
+    response = http_client.get(api_url)
+
+    if response.status_code != 200:
+        logger.warning("Failed to fetch COVID history for %s: %s", country, response.status_code)
+        return []
+
+    timeline = response.json().get('timeline', {})
+    cases = timeline.get('cases', {})
+    deaths = timeline.get('deaths', {})
+    rows = [
+        {'country': country, 'total_confirmed': cases[key], 'total_deaths': deaths.get(key, 0), 'date': date}
+        for key, date in zip(cases.keys(), _timeline_dates(cases))
+    ]
+    logger.debug("Fetched %d days of COVID history for %s", len(rows), country)
+    return rows
+
+
+def _fetch_vaccination_history_country(country, lastdays):
+    api_url = f"{DISEASE_SH_URL}/vaccine/coverage/countries/{country}?lastdays={lastdays}"
+    response = http_client.get(api_url)
+
+    if response.status_code != 200:
+        logger.warning("Failed to fetch vaccination history for %s: %s", country, response.status_code)
+        return []
+
+    timeline = response.json().get('timeline', {})
+    rows = [
+        {'country': country, 'total_vaccinations': total, 'date': date}
+        for total, date in zip(timeline.values(), _timeline_dates(timeline))
+    ]
+    logger.debug("Fetched %d days of vaccination history for %s", len(rows), country)
+    return rows
+
+
+def fetch_covid_history(countries, lastdays=BACKFILL_DAYS, max_workers=MAX_WORKERS, executor=None):
+    """
+    Fetches daily COVID-19 totals from the disease.sh historical endpoint.
+    Returns a DataFrame with one row per (country, date).
+    """
+    rows = _map_batches(lambda batch: _fetch_covid_history_country(batch[0], _days_for(batch[0], lastdays)),
+                        countries, 1, max_workers, executor)
+    return _frame(rows)
+
+
+def fetch_vaccination_history(countries, lastdays=BACKFILL_DAYS, max_workers=MAX_WORKERS, executor=None):
+    """
+    Fetches daily vaccination totals from the disease.sh coverage endpoint.
+    Returns a DataFrame with one row per (country, date).
+    """
+    rows = _map_batches(lambda batch: _fetch_vaccination_history_country(batch[0], _days_for(batch[0], lastdays)),
+                        countries, 1, max_workers, executor)
+    return _frame(rows)
+
+
+def fetch_all_history(countries, lastdays=BACKFILL_DAYS, max_workers=MAX_WORKERS, batch_size=BATCH_SIZE):
+    """
+    Fetches daily COVID-19 and vaccination time series from the disease.sh
+    historical endpoints, plus population data, concurrently.
+    lastdays is the number of days to fetch, either for every country or
+    as a {country: days} mapping (e.g. derived from stored high-water marks).
+    Returns (covid_data, vaccine_data, population_data) DataFrames; the first
+    two have one row per (country, date).
+    """
+    countries = list(countries)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        covid_futures = [executor.submit(_fetch_covid_history_country, c, _days_for(c, lastdays)) for c in countries]
+        vaccine_futures = [executor.submit(_fetch_vaccination_history_country, c, _days_for(c, lastdays)) for c in countries]
+        population_futures = [executor.submit(_fetch_population_batch, b) for b in _chunks(countries, batch_size)]
+
+        covid_rows = [row for f in covid_futures for row in f.result()]
+        vaccine_rows = [row for f in vaccine_futures for row in f.result()]
+        population_rows = [row for f in population_futures for row in f.result()]
+
+    covid_data = _frame(covid_rows)
+    vaccine_data = _frame(vaccine_rows)
+    population_data = _frame(population_rows)
+
+    logger.info("Fetched history for %d countries: %d COVID rows, %d vaccination rows.",
+                len(countries), len(covid_data), len(vaccine_data))
+    return covid_data, vaccine_data, population_data
+
+
+def iter_data_chunks(countries, chunk_size=BATCH_SIZE, mode='snapshot', lastdays=BACKFILL_DAYS, max_workers=MAX_WORKERS):
+    """
+    Yields (covid_data, vaccine_data, population_data) for chunk_size
+    countries at a time, using fetch_all_data (mode='snapshot') or
+    fetch_all_history (mode='timeseries'). The next chunk is fetched in the
+    background while the caller processes the current one, so at most two
+    chunks are held in memory.
+    """
+    chunks = _chunks(list(countries), chunk_size)
+    if not chunks:
+        return
+
+    def fetch(chunk):
+        if mode == 'timeseries':
+            return fetch_all_history(chunk, lastdays, max_workers=max_workers)
+        return fetch_all_data(chunk, max_workers=max_workers)
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        future = prefetcher.submit(fetch, chunks[0])
+        for index in range(len(chunks)):
+            result = future.result()
+            if index + 1 < len(chunks):
+                future = prefetcher.submit(fetch, chunks[index + 1])
+            yield result
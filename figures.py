@@ -0,0 +1,163 @@
+import json
+import sqlite3
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import db
+import queries
+
+# Above this many points scatter traces switch to WebGL (scattergl)
+WEBGL_THRESHOLD = 1000
+# Per-point country labels are only drawn for small charts
+LABEL_THRESHOLD = 50
+# Long time series are decimated to at most this many points per trace
+MAX_SERIES_POINTS = 1500
+# Rates are rounded before serialization, the charts show them in percent
+RATE_DECIMALS = 3
+RATE_COLUMNS = ['infection_rate', 'vaccination_rate', 'net_infection_rate']
+
+# View key of the unfiltered dashboard prebuilt by the pipeline
+DEFAULT_VIEW = 'default'
+
+
+def decimate(data, max_points=MAX_SERIES_POINTS):
+    """
+    Evenly samples a time series down to max_points rows, always keeping
+    the first and last point.
+    """
+    if len(data) <= max_points:
+        return data
+    positions = np.unique(np.linspace(0, len(data) - 1, max_points).round().astype(int))
+    return data.iloc[positions]
+
+
+def _compact(fig):
+    """
+    Serializes a figure once, without validation, into a plain JSON dict.
+    """
+    return json.loads(pio.to_json(fig, validate=False, remove_uids=True))
+
+
+def cases_vs_vaccinations(df):
+    labelled = len(df) <= LABEL_THRESHOLD
+    fig = px.scatter(df, x='total_cases', y='total_vaccinations',
+                     text='country' if labelled else None,  # Add country labels
+                     hover_name='country',
+                     render_mode='webgl' if len(df) > WEBGL_THRESHOLD else 'auto',
+                     title='COVID-19 Cases vs Vaccinations by Country',
+                     labels={'total_cases': 'Total Cases',
+                             'total_vaccinations': 'Total Vaccinations'})
+    if labelled:
+        fig.update_traces(textposition='top center')
+    return fig
+
+
+def vaccination_rate_chart(df):
+    return px.bar(df, x='country', y='vaccination_rate',
+                  title='Vaccination Rate by Country',
+                  labels={'vaccination_rate': 'Vaccination Rate (%)',
+                          'country': 'Country'},
+                  color='vaccination_rate',
+                  color_continuous_scale='Viridis')
+
+
+def infection_vs_vaccination_chart(df):
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=df['country'],
+        y=df['infection_rate'],
+        name='Infection Rate',
+        marker_color='#ff7f7f'
+    ))
+    fig.add_trace(go.Bar(
+        x=df['country'],
+        y=df['vaccination_rate'],
+        name='Vaccination Rate',
+        marker_color='#7fb3ff'
+    ))
+    fig.update_layout(
+        barmode='group',
+        title='Infection Rate vs Vaccination Rate by Country',
+        yaxis_title='Rate (%)'
+    )
+    return fig
+
+
+def trend_chart(trend):
+    trend = decimate(trend)
+    scatter = go.Scattergl if len(trend) > WEBGL_THRESHOLD else go.Scatter
+    fig = go.Figure()
+    fig.add_trace(scatter(x=trend['date'], y=trend['total_cases'], name='Total Cases', mode='lines'))
+    fig.add_trace(scatter(x=trend['date'], y=trend['total_vaccinations'], name='Total Vaccinations', mode='lines'))
+    fig.update_layout(title='Cases and Vaccinations over Time', yaxis_title='Count')
+    return fig
+
+
+def build_outputs(df, totals, trend):
+    """
+    Builds the dashboard outputs: formatted totals and the four figures as
+    compact JSON dicts.
+    """
+    df = df.round({col: RATE_DECIMALS for col in RATE_COLUMNS if col in df.columns})
+    cases, vaccinations = totals
+    return (
+        f"{int(cases):,}",
+        f"{int(vaccinations):,}",
+        _compact(cases_vs_vaccinations(df)),
+        _compact(vaccination_rate_chart(df)),
+        _compact(infection_vs_vaccination_chart(df)),
+        _compact(trend_chart(trend)),
+    )
+
+
+def empty_outputs():
+    empty_fig = _compact(go.Figure())
+    return "N/A", "N/A", empty_fig, empty_fig, empty_fig, empty_fig
+
+
+def prebuild_default_view(db_file='covid_vaccine.db'):
+    """
+    Builds the unfiltered dashboard view right after a load and stores its
+    JSON tagged with the data version, so dashboards can serve it without
+    querying or plotting. Returns the version, or None if there is no data.
+    """
+    conn = db.connect(db_file)
+    try:
+        version = db.read_data_version(conn)
+    finally:
+        conn.close()
+
+    df = queries.read_latest(db_file, top_n=queries.DEFAULT_TOP_N)
+    if df.empty:
+        return None
+    totals = queries.read_totals(db_file) or (df['total_cases'].sum(), df['total_vaccinations'].sum())
+    outputs = build_outputs(df, totals, queries.read_trend(db_file))
+
+    conn = db.connect(db_file)
+    try:
+        conn.execute(db.FIGURES_SCHEMA)
+        conn.execute(
+            "INSERT OR REPLACE INTO dashboard_figures (view, version, payload, built_at) VALUES (?, ?, ?, datetime('now'))",
+            (DEFAULT_VIEW, version, json.dumps(outputs, separators=(',', ':')))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return version
+
+
+def load_prebuilt(db_file, version, view=DEFAULT_VIEW):
+    """
+    Returns the prebuilt outputs of view for this data version, or None.
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        row = conn.execute('SELECT payload FROM dashboard_figures WHERE view = ? AND version = ?', (view, version)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return tuple(json.loads(row[0])) if row else None
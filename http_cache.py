@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = os.environ.get('HTTP_CACHE_FILE', 'http_cache.db')
+CACHE_ENABLED = os.environ.get('HTTP_CACHE_DISABLED', '0') != '1'
+# Offline replay: serve everything from the cache, never touch the network
+OFFLINE = os.environ.get('HTTP_CACHE_OFFLINE', '0') == '1'
+# Least recently used entries are evicted above this size
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Seconds to wait for a lock held by another process (e.g. parallel workers)
+BUSY_TIMEOUT = 30
+
+# Time-to-live per host in seconds; stale entries are revalidated with
+# If-None-Match / If-Modified-Since before being refetched
+CACHE_TTLS = {
+    'api.worldbank.org': 30 * 24 * 3600,  # fixed-year population indicator
+    'disease.sh': 12 * 3600,
+}
+DEFAULT_TTL = 3600
+
+_conn = None
+_lock = threading.Lock()
+
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(CACHE_FILE, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS http_responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                accessed_at REAL,
+                size INTEGER
+            )
+        ''')
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def _failed(operation, url, error):
+    # The cache is an optimization: on errors (e.g. 'database is locked')
+    # the request simply goes to, or comes from, the network
+    logger.warning("HTTP cache %s failed for %s: %s", operation, url, error)
+    if _conn is not None and _conn.in_transaction:
+        _conn.rollback()
+
+
+def ttl_for(host):
+    return CACHE_TTLS.get(host, DEFAULT_TTL)
+
+
+def lookup(url):
+    """
+    Returns the cached entry for url as a dict, or None (also if the cache
+    cannot be read).
+    """
+    with _lock:
+        try:
+            conn = _get_conn()
+            row = conn.execute(
+                'SELECT status, headers, body, etag, last_modified, fetched_at FROM http_responses WHERE url = ?',
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE http_responses SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            conn.commit()
+        except sqlite3.Error as e:
+            _failed('lookup', url, e)
+            return None
+    status, headers, body, etag, last_modified, fetched_at = row
+    return {
+        'status': status,
+        'headers': json.loads(headers),
+        'body': body,
+        'etag': etag,
+        'last_modified': last_modified,
+        'fetched_at': fetched_at,
+    }
+
+
+def is_fresh(entry, ttl):
+    return time.time() - entry['fetched_at'] < ttl
+
+
+def conditional_headers(entry):
+    """
+    Builds revalidation headers from a cached entry.
+    """
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def store(url, response):
+    """
+    Caches a successful response and evicts old entries if the cache grew
+    past CACHE_MAX_BYTES.
+    """
+    body = response.content
+    headers = {k: v for k, v in response.headers.items() if k.lower() in ('content-type', 'etag', 'last-modified')}
+    now = time.time()
+    with _lock:
+        try:
+            conn = _get_conn()
+            conn.execute(
+                'INSERT OR REPLACE INTO http_responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, response.status_code, json.dumps(headers), body,
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now, len(body))
+            )
+            conn.commit()
+            _evict(conn)
+        except sqlite3.Error as e:
+            _failed('store', url, e)
+
+
+def touch(url):
+    """
+    Marks a cached entry as freshly validated (after a 304).
+    """
+    now = time.time()
+    with _lock:
+        try:
+            conn = _get_conn()
+            conn.execute('UPDATE http_responses SET fetched_at = ?, accessed_at = ? WHERE url = ?', (now, now, url))
+            conn.commit()
+        except sqlite3.Error as e:
+            _failed('touch', url, e)
+
+
+def _evict(conn):
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM http_responses').fetchone()[0]
+    if total <= CACHE_MAX_BYTES:
+        return
+    removed = 0
+    for url, size in conn.execute('SELECT url, size FROM http_responses ORDER BY accessed_at').fetchall():
+        if total <= CACHE_MAX_BYTES:
+            break
+        conn.execute('DELETE FROM http_responses WHERE url = ?', (url,))
+        total -= size
+        removed += 1
+    conn.commit()
+    logger.info("Evicted %s entries from HTTP cache", removed)
+
+
+def to_response(url, entry):
+    """
+    Rebuilds a requests.Response from a cached entry.
+    """
+    import requests
+    response = requests.Response()
+    response.status_code = entry['status']
+    response._content = entry['body']
+    response.headers.update(entry['headers'])
+    response.url = url
+    response.encoding = 'utf-8'
+    return response
+
+
+def offline_miss(url):
+    """
+    Response returned in offline mode when url is not cached.
+    """
+    import requests
+    response = requests.Response()
+    response.status_code = 504
+    response._content = b''
+    response.url = url
+    return response
+
+
+def clear():
+    """
+    Removes every cached response.
+    """
+    with _lock:
+        conn = _get_conn()
+        conn.execute('DELETE FROM http_responses')
+        conn.commit()
@@ -0,0 +1,234 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import http_cache
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Connection pool size per host, should be >= extract.MAX_WORKERS
+POOL_SIZE = 32
+REQUEST_TIMEOUT = 30  # seconds
+
+# Retry policy: exponential backoff with full jitter, capped at BACKOFF_MAX
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_MAX = 30  # seconds
+# A server's Retry-After is honored as sent, up to this sanity cap
+RETRY_AFTER_MAX = 600  # seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Client-side rate limits per host: (requests per second, burst size)
+RATE_LIMITS = {
+    'disease.sh': (20, 40),
+    'api.worldbank.org': (10, 20),
+}
+DEFAULT_RATE_LIMIT = (10, 20)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_session = None
+_buckets = {}
+_rate_share = 1.0
+_stats = {}
+_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the shared, pooled requests session (created on first use).
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            # Imported on first use, so importing this module stays cheap
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def _bucket_for(host):
+    with _lock:
+        if host not in _buckets:
+            rate, burst = RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT)
+            _buckets[host] = TokenBucket(rate * _rate_share, max(1, burst * _rate_share))
+        return _buckets[host]
+
+
+def set_rate_share(share):
+    """
+    Limits this process to a share of each host's rate limit, e.g. 1/N when
+    N worker processes call the same APIs.
+    """
+    global _rate_share
+    with _lock:
+        _rate_share = share
+        _buckets.clear()
+
+
+def _record(host, latency=None, retry=False, failure=False, cache_hit=False, revalidated=False):
+    with _lock:
+        stats = _stats.setdefault(host, {'requests': 0, 'retries': 0, 'failures': 0, 'latency_total': 0.0,
+                                         'cache_hits': 0, 'revalidated': 0})
+        if latency is not None:
+            stats['requests'] += 1
+            stats['latency_total'] += latency
+        if retry:
+            stats['retries'] += 1
+        if failure:
+            stats['failures'] += 1
+        if cache_hit:
+            stats['cache_hits'] += 1
+        if revalidated:
+            stats['revalidated'] += 1
+
+
+def _retry_after(response):
+    """
+    Parses a Retry-After header (seconds or HTTP-date) into seconds.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def get(url, headers=None, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES, ttl=None):
+    """
+    Issues a rate-limited GET through the shared session, retrying
+    throttled (429), 5xx and connection errors with exponential backoff and
+    jitter. Retry-After is honored when the server sends it.
+
+    Responses are served from the on-disk cache while younger than ttl
+    (default: the per-host TTL in http_cache); stale entries are revalidated
+    with a conditional request.
+    Returns the final response; raises if every attempt errored.
+    """
+    host = urlsplit(url).hostname or ''
+
+    entry = None
+    if http_cache.CACHE_ENABLED:
+        entry = http_cache.lookup(url)
+        if entry and (http_cache.OFFLINE or http_cache.is_fresh(entry, ttl if ttl is not None else http_cache.ttl_for(host))):
+            _record(host, cache_hit=True)
+            return http_cache.to_response(url, entry)
+        if http_cache.OFFLINE:
+            logger.warning("Offline mode: no cached response for %s", url)
+            return http_cache.offline_miss(url)
+        if entry:
+            headers = {**(headers or {}), **http_cache.conditional_headers(entry)}
+
+    import requests
+    bucket = _bucket_for(host)
+    session = get_session()
+
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        started = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            _record(host, latency=time.perf_counter() - started)
+            if attempt == max_retries:
+                _record(host, failure=True)
+                raise
+            _record(host, retry=True)
+            delay = _backoff(attempt)
+            logger.warning("Request to %s failed (%s), retrying in %.1fs", url, e, delay)
+            time.sleep(delay)
+            continue
+
+        _record(host, latency=time.perf_counter() - started)
+        if response.status_code == 304 and entry:
+            _record(host, revalidated=True)
+            http_cache.touch(url)
+            return http_cache.to_response(url, entry)
+        if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+            if response.status_code >= 400:
+                _record(host, failure=True)
+            elif response.status_code == 200 and http_cache.CACHE_ENABLED:
+                http_cache.store(url, response)
+            return response
+
+        _record(host, retry=True)
+        delay = _retry_after(response)
+        if delay is None:
+            delay = _backoff(attempt)
+        elif delay > RETRY_AFTER_MAX:
+            logger.warning("Retry-After of %.0fs from %s exceeds %ss, waiting %ss", delay, url, RETRY_AFTER_MAX,
+                           RETRY_AFTER_MAX)
+            delay = RETRY_AFTER_MAX
+        logger.warning("Got %s from %s, retrying in %.1fs", response.status_code, url, delay)
+        time.sleep(delay)
+
+
+def get_stats():
+    """
+    Returns per-host counters: requests, retries, failures, cache hits,
+    revalidations and latency.
+    """
+    with _lock:
+        return {
+            host: {
+                'requests': s['requests'],
+                'retries': s['retries'],
+                'failures': s['failures'],
+                'cache_hits': s['cache_hits'],
+                'revalidated': s['revalidated'],
+                'latency_total': round(s['latency_total'], 4),
+                'latency_avg': round(s['latency_total'] / s['requests'], 4) if s['requests'] else 0.0,
+            }
+            for host, s in _stats.items()
+        }
+
+
+def reset_stats():
+    """
+    Clears the per-host counters.
+    """
+    with _lock:
+        _stats.clear()
@@ -1,11 +1,30 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 
+import db
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
 def save_to_csv(data, file_name):
     """
     Saves the transformed data to a CSV file.
     """
     data.to_csv(file_name, index=False)
-    print(f"Data successfully saved to {file_name}")
+    logger.info("Data successfully saved to %s", file_name)
+
+def save_to_parquet(data, root_dir='covid_parquet', file_format='parquet'):
+    """
+    Saves the transformed data to a columnar dataset partitioned by date
+    (Parquet, or Arrow IPC with file_format='ipc').
+    """
+    import columnar_store
+    columnar_store.write_dataset(data, root_dir, file_format=file_format)
+    logger.info("Data successfully saved to %s (%s).", root_dir, file_format)
 
 def save_to_database(data, db_connection_string, table_name):
     """
@@ -18,40 +37,281 @@ def save_to_database(data, db_connection_string, table_name):
 
     # Save the data to the specified table in the database
     data.to_sql(table_name, engine, if_exists='replace', index=False)
-    print(f"Data successfully saved to {table_name} in the database.")
+    logger.info("Data successfully saved to %s in the database.", table_name)
 
-def load_data(file_name="final_data.csv", db_connection_string=None, table_name="covid_vaccine_data"):
+def _to_records(data, columns):
     """
-    Loads the transformed data into a file or a database.
+    Converts the given columns to a list of tuples of plain Python values
+    (NaN becomes NULL) suitable for executemany.
     """
-    # Save the final data to a CSV file
-    save_to_csv(data, file_name)
-
-    # Optionally, if a database connection string is provided, save the data to the database
-    if db_connection_string:
-        save_to_database(data, db_connection_string, table_name)
-
-import sqlite3
-import pandas as pd
+    frame = data[columns].astype(object)
+    frame = frame.where(pd.notna(frame), None)
+    return [tuple(row) for row in frame.itertuples(index=False, name=None)]
 
 def save_to_sqlite(data, db_file='covid_vaccine.db', table_name='covid_vaccine_data'):
     """
-    Saves the transformed data to an SQLite database.
+    Saves the transformed data to an SQLite database, replacing the
+    table contents. The new data is built in a staging table and swapped
+    in atomically, so readers see either the old or the new version.
     """
     # Connect to SQLite database (it will create the file if it doesn't exist)
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
+    conn = db.connect(db_file)
+    conn.isolation_level = None
+    staging_table = f'{table_name}_staging'
+    placeholders = ', '.join('?' for _ in db.COLUMNS)
+
+    try:
+        # Build the staging table, readers of table_name are unaffected
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(f'DROP TABLE IF EXISTS {staging_table}')
+        db.ensure_schema(conn, staging_table, staging=True)
+        conn.executemany(
+            f'INSERT OR REPLACE INTO {staging_table} ({", ".join(db.COLUMNS)}) VALUES ({placeholders})',
+            _to_records(data, db.COLUMNS)
+        )
+        conn.execute('COMMIT')
 
-    # Save data to the specified table in SQLite
-    data.to_sql(table_name, conn, if_exists='replace', index=False)
-    print(f"Data successfully saved to {table_name} in SQLite database.")
+        # Swap it in, rebuilding the indexes and summaries in the same transaction
+        conn.execute('BEGIN IMMEDIATE')
+        db.ensure_schema(conn, table_name)
+        conn.execute(f'DROP TABLE {table_name}')
+        conn.execute(f'ALTER TABLE {staging_table} RENAME TO {table_name}')
+        db.ensure_schema(conn, table_name)
+        db.refresh_summaries(conn, table_name)
+        db.bump_data_version(conn)
+        conn.execute('COMMIT')
+        logger.info("Data successfully saved to %s in SQLite database.", table_name)
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
 
-    # Commit changes and close the connection
-    conn.commit()
-    conn.close()
+def upsert_to_sqlite(data, db_file='covid_vaccine.db', table_name='covid_vaccine_data'):
+    """
+    Incrementally loads the transformed data into SQLite, keyed on
+    (country, date). New keys are inserted, changed rows updated and
+    identical rows left untouched, and the summary tables of the touched
+    countries refreshed, all in one transaction.
+    Returns a dict with inserted, updated and unchanged row counts.
+    """
+    data = data.drop_duplicates(subset=db.KEY_COLUMNS, keep='last')
+    columns = ', '.join(db.COLUMNS)
+    placeholders = ', '.join('?' for _ in db.COLUMNS)
+    changed = ' OR '.join(f'{table_name}.{c} IS NOT excluded.{c}' for c in db.VALUE_COLUMNS)
+    differs = ' OR '.join(f'm.{c} IS NOT s.{c}' for c in db.VALUE_COLUMNS)
+    assignments = ', '.join(f'{c} = excluded.{c}' for c in db.VALUE_COLUMNS)
+
+    conn = db.connect(db_file)
+    conn.isolation_level = None
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        db.ensure_schema(conn, table_name)
+
+        # Stage the batch so the counts and the upsert are set-based
+        conn.execute(f'CREATE TEMP TABLE _staging AS SELECT * FROM {table_name} WHERE 0')
+        conn.executemany(f'INSERT INTO _staging ({columns}) VALUES ({placeholders})', _to_records(data, db.COLUMNS))
+
+        inserted = conn.execute(f'''
+            SELECT COUNT(*) FROM _staging s
+            WHERE NOT EXISTS (SELECT 1 FROM {table_name} m WHERE m.country = s.country AND m.date = s.date)
+        ''').fetchone()[0]
+        updated = conn.execute(f'''
+            SELECT COUNT(*) FROM _staging s
+            JOIN {table_name} m ON m.country = s.country AND m.date = s.date
+            WHERE {differs}
+        ''').fetchone()[0]
+
+        conn.execute(f'''
+            INSERT INTO {table_name} ({columns})
+            SELECT {columns} FROM _staging WHERE true
+            ON CONFLICT (country, date) DO UPDATE SET {assignments}
+            WHERE {changed}
+        ''')
+        if inserted or updated:
+            db.refresh_summaries(conn, table_name, countries_table='_staging')
+            db.bump_data_version(conn)
+        conn.execute('DROP TABLE _staging')
+        conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+    counts = {'inserted': inserted, 'updated': updated, 'unchanged': len(data) - inserted - updated}
+    logger.info("Upserted into %s: %d inserted, %d updated, %d unchanged.",
+                table_name, counts['inserted'], counts['updated'], counts['unchanged'])
+    return counts
+
+def save_country_regions(data, db_file='covid_vaccine.db'):
+    """
+    Stores the continent of each country (from the disease.sh snapshot)
+    for region filtering in the dashboard.
+    """
+    if 'continent' not in data.columns:
+        return
+    regions = data[['country', 'continent']].dropna().drop_duplicates('country')
+    conn = db.connect(db_file)
+    try:
+        db.ensure_schema(conn)
+        conn.executemany('INSERT OR REPLACE INTO country_regions (country, continent) VALUES (?, ?)',
+                         _to_records(regions, ['country', 'continent']))
+        conn.commit()
+    finally:
+        conn.close()
 
-def load_data_to_sqlite(data, db_file='covid_vaccine.db', table_name='covid_vaccine_data'):
+def load_data_to_sqlite(data, db_file='covid_vaccine.db', table_name='covid_vaccine_data', mode='upsert'):
     """
     Loads the transformed data into SQLite database.
+    mode='upsert' merges rows incrementally and keeps history,
+    mode='replace' rewrites the whole table.
     """
-    save_to_sqlite(data, db_file, table_name)
+    if mode == 'replace':
+        save_to_sqlite(data, db_file, table_name)
+        return None
+    return upsert_to_sqlite(data, db_file, table_name)
+
+# Connection pools per PostgreSQL DSN, reused across loads
+PG_POOL_SIZE = 4
+_pg_pools = {}
+_pg_pools_lock = threading.Lock()
+
+PG_TABLE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        country TEXT NOT NULL,
+        date DATE NOT NULL,
+        total_cases BIGINT,
+        total_deaths BIGINT,
+        infection_rate DOUBLE PRECISION,
+        total_vaccinations BIGINT,
+        vaccination_rate DOUBLE PRECISION,
+        net_infection_rate DOUBLE PRECISION,
+        PRIMARY KEY (country, date)
+    )
+'''
+# BIGINT columns; missing values make pandas hold them as floats ('200.0'),
+# which COPY rejects
+PG_INTEGER_COLUMNS = ['total_cases', 'total_deaths', 'total_vaccinations']
+
+def _get_pg_pool(dsn):
+    with _pg_pools_lock:
+        if dsn not in _pg_pools:
+            from psycopg2.pool import ThreadedConnectionPool
+            _pg_pools[dsn] = ThreadedConnectionPool(1, PG_POOL_SIZE, dsn)
+        return _pg_pools[dsn]
+
+def close_pg_pools():
+    """
+    Closes every pooled PostgreSQL connection.
+    """
+    with _pg_pools_lock:
+        for pool in _pg_pools.values():
+            pool.closeall()
+        _pg_pools.clear()
+
+def save_to_postgres(data, dsn, table_name='covid_vaccine_data', mode='upsert'):
+    """
+    Bulk loads the transformed data into PostgreSQL with COPY FROM STDIN.
+    mode='upsert' copies into a temporary table and merges on
+    (country, date); mode='replace' copies into <table_name>_staging and
+    swaps it in, so readers are only blocked for the rename, not the COPY.
+    Returns inserted/updated/unchanged counts (upsert) or None (replace).
+    """
+    data = data.drop_duplicates(subset=db.KEY_COLUMNS, keep='last')
+    frame = data[db.COLUMNS].copy()
+    for col in PG_INTEGER_COLUMNS:
+        frame[col] = pd.to_numeric(frame[col]).round().astype('Int64')
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    columns = ', '.join(db.COLUMNS)
+
+    pool = _get_pg_pool(dsn)
+    conn = pool.getconn()
+    try:
+        with conn:  # one transaction, committed on success
+            with conn.cursor() as cursor:
+                cursor.execute(PG_TABLE_SCHEMA.format(table=table_name))
+                if mode == 'replace':
+                    staging = f'{table_name}_staging'
+                    cursor.execute(f'DROP TABLE IF EXISTS {staging}')
+                    cursor.execute(PG_TABLE_SCHEMA.format(table=staging))
+                    cursor.copy_expert(f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+                    # The exclusive locks of the swap are only held until the commit right after
+                    cursor.execute(f'ALTER TABLE {table_name} RENAME TO {table_name}_old')
+                    cursor.execute(f'ALTER TABLE {staging} RENAME TO {table_name}')
+                    cursor.execute(f'DROP TABLE {table_name}_old')
+                    cursor.execute(f'ALTER INDEX {staging}_pkey RENAME TO {table_name}_pkey')
+                    logger.info("Data successfully copied to %s in PostgreSQL.", table_name)
+                    return None
+
+                cursor.execute(f'CREATE TEMP TABLE _staging (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP')
+                cursor.copy_expert(f'COPY _staging ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+                values = ', '.join(db.VALUE_COLUMNS)
+                excluded = ', '.join(f'excluded.{c}' for c in db.VALUE_COLUMNS)
+                assignments = ', '.join(f'{c} = excluded.{c}' for c in db.VALUE_COLUMNS)
+                # xmax = 0 marks freshly inserted rows; unchanged rows are skipped by the WHERE
+                cursor.execute(f'''
+                    WITH upserted AS (
+                        INSERT INTO {table_name} ({columns})
+                        SELECT {columns} FROM _staging
+                        ON CONFLICT (country, date) DO UPDATE SET {assignments}
+                        WHERE ({', '.join(f'{table_name}.{c}' for c in db.VALUE_COLUMNS)}) IS DISTINCT FROM ({excluded})
+                        RETURNING (xmax = 0) AS inserted
+                    )
+                    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+                ''')
+                inserted, updated = cursor.fetchone()
+    finally:
+        pool.putconn(conn)
+
+    counts = {'inserted': inserted, 'updated': updated, 'unchanged': len(data) - inserted - updated}
+    logger.info("Upserted into %s (PostgreSQL): %d inserted, %d updated, %d unchanged.",
+                table_name, counts['inserted'], counts['updated'], counts['unchanged'])
+    return counts
+
+# Sink types accepted by load_data, each called as writer(data, **options)
+SINK_WRITERS = {
+    'csv': save_to_csv,
+    'sqlite': load_data_to_sqlite,
+    'postgres': save_to_postgres,
+    'parquet': save_to_parquet,
+    'database': save_to_database,
+}
+
+def load_data(data, sinks=None, max_workers=None, file_name="final_data.csv", db_connection_string=None, table_name="covid_vaccine_data"):
+    """
+    Loads the transformed data into every sink concurrently.
+    Each sink is a dict with a 'type' (csv, sqlite, postgres, parquet or
+    database) and the keyword options of its writer, plus an optional
+    'name', e.g. {'type': 'postgres', 'dsn': 'postgresql://...'}.
+    Without sinks, writes file_name as CSV and, if db_connection_string is
+    given, the database it points to.
+    Returns {sink name: writer result}.
+    """
+    if sinks is None:
+        sinks = [{'type': 'csv', 'file_name': file_name}]
+        if db_connection_string:
+            sinks.append({'type': 'database', 'db_connection_string': db_connection_string, 'table_name': table_name})
+
+    def write(sink):
+        options = {k: v for k, v in sink.items() if k not in ('type', 'name')}
+        return SINK_WRITERS[sink['type']](data, **options)
+
+    names = [sink.get('name', sink['type']) for sink in sinks]
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(sinks))) as executor:
+        futures = [executor.submit(write, sink) for sink in sinks]
+
+    results, errors = {}, {}
+    for name, future in zip(names, futures):
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.error("Failed to load data into %s: %s", name, e)
+            errors[name] = e
+    if errors:
+        raise RuntimeError(f"Loading failed for sinks: {', '.join(errors)}")
+    return results
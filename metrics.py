@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import db
+import http_client
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# tracemalloc slows allocation-heavy stages down, so per-stage peak memory
+# is only traced on request; the process peak RSS is always reported
+TRACE_MEMORY = os.environ.get('PIPELINE_TRACE_MEMORY', '') not in ('', '0')
+
+
+def _http_requests():
+    return sum(s['requests'] for s in http_client.get_stats().values())
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def record_frames(record, **frames):
+    """
+    Adds output row counts and DataFrame memory usage to a stage record.
+    """
+    record['frames'] = {
+        name: {'rows': len(frame), 'memory_bytes': int(frame.memory_usage(deep=True).sum())}
+        for name, frame in frames.items()
+    }
+    record['rows_out'] = sum(f['rows'] for f in record['frames'].values())
+    record['memory_bytes'] = sum(f['memory_bytes'] for f in record['frames'].values())
+
+
+class PipelineMetrics:
+    """
+    Collects per-stage wall time, HTTP requests, row counts and memory for
+    one pipeline run and persists them as a JSON record in pipeline_runs.
+    Per-stage peak memory needs trace_memory (default: PIPELINE_TRACE_MEMORY).
+    """
+
+    def __init__(self, run_id=None, trace_memory=None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.trace_memory = TRACE_MEMORY if trace_memory is None else trace_memory
+        self.stages = []
+        self._started = time.perf_counter()
+        # HTTP counters are process-wide, start each run from zero
+        http_client.reset_stats()
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Times the enclosed block. Yields the stage record so the caller can
+        attach outputs with record_frames(). HTTP request counts and peak
+        memory are process-wide, so for stages running in parallel they
+        cover the overlapping stages too.
+        """
+        record = {'stage': name, 'rows_in': rows_in}
+        requests_before = _http_requests()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_time_s'] = round(time.perf_counter() - started, 4)
+            record['http_requests'] = _http_requests() - requests_before
+            if self.trace_memory:
+                record['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(record)
+            logger.info("Stage %s: %ss, rows in=%s, rows out=%s, http requests=%s", name, record['wall_time_s'],
+                        record.get('rows_in'), record.get('rows_out'), record['http_requests'],
+                        extra={'run_id': self.run_id, 'stage_metrics': record})
+
+    def to_dict(self, status='success', error=None):
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'status': status,
+            'error': error,
+            'duration_s': round(time.perf_counter() - self._started, 4),
+            'http': http_client.get_stats(),
+            'peak_rss_bytes': _peak_rss_bytes(),
+            'stages': self.stages,
+        }
+
+    def save(self, db_file='covid_vaccine.db', status='success', error=None):
+        """
+        Writes the run record to the pipeline_runs table and returns it.
+        """
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        run = self.to_dict(status, error)
+        conn = db.connect(db_file)
+        try:
+            db.ensure_runs_table(conn)
+            conn.execute(
+                'INSERT OR REPLACE INTO pipeline_runs (run_id, started_at, status, duration_s, metrics) VALUES (?, ?, ?, ?, ?)',
+                (run['run_id'], run['started_at'], status, run['duration_s'], json.dumps(run))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return run
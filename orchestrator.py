@@ -1,65 +1,281 @@
+import argparse
+import hashlib
+import json
 import logging
-from extract import fetch_covid_data, fetch_vaccination_data, fetch_population_data
-from transform import transform_covid_data, transform_vaccine_data, final_transformation
-from load import load_data_to_sqlite
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import db
+import log_config
+from dag import Task, run_dag, STAGING_DIR
+from extract import (fetch_covid_data, fetch_vaccination_data, fetch_population_data, fetch_covid_history,
+                     fetch_vaccination_history, iter_data_chunks, MAX_WORKERS, BACKFILL_DAYS, BATCH_SIZE)
+from metrics import PipelineMetrics, record_frames
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def orchestrate_pipeline(countries_list):
-    try:
-        # Step 1: Extract Data
-        logger.info("Starting data extraction...")
-        covid_data = fetch_covid_data(countries_list)
-        logger.info(f"COVID data shape: {covid_data.shape}")
-        logger.info(f"COVID data sample: {covid_data.head()}")
-        
-        vaccine_data = fetch_vaccination_data(countries_list)
-        logger.info(f"Vaccine data shape: {vaccine_data.shape}")
-        logger.info(f"Vaccine data sample: {vaccine_data.head()}")
-        
-        population_data = fetch_population_data(countries_list)
-        logger.info(f"Population data shape: {population_data.shape}")
-        logger.info(f"Population data sample: {population_data.head()}")
-
-        logger.info("Data extraction completed.")
-
-        # Step 2: Transform Data
-        logger.info("Starting data transformation...")
-        covid_data_transformed = transform_covid_data(covid_data, population_data)
-        logger.info(f"Transformed COVID data shape: {covid_data_transformed.shape}")
-        
-        vaccine_data_transformed = transform_vaccine_data(vaccine_data, population_data)
-        logger.info(f"Transformed vaccine data shape: {vaccine_data_transformed.shape}")
-        
-        final_data = final_transformation(covid_data_transformed, vaccine_data_transformed)
-        logger.info(f"Final data shape: {final_data.shape}")
-        logger.info(f"Final data sample: {final_data.head()}")
-
-        logger.info("Data transformation completed.")
-
-        # Step 3: Load Data to SQLite
-        logger.info("Starting data load...")
-        if not final_data.empty:
-            load_data_to_sqlite(final_data, db_file='covid_vaccine.db', table_name='covid_vaccine_data')
-            logger.info("Data load completed.")
+# List of countries (example)
+COUNTRIES = [
+    "USA",
+    "GBR",  # United Kingdom
+    "DEU",  # Germany
+    "FRA",  # France
+    "ITA"   # Italy
+]
+
+def days_since_high_water_mark(countries_list, backfill_days=BACKFILL_DAYS, db_file='covid_vaccine.db'):
+    """
+    Returns {country: days to fetch}. Countries with timeseries history fetch
+    from their high-water mark (inclusive), others backfill_days.
+    Fetches are capped at backfill_days; a longer gap is logged as a warning.
+    """
+    marks = db.get_high_water_marks(db_file, 'timeseries')
+    today = date.today()
+    lastdays = {}
+    for country in countries_list:
+        if country in marks:
+            days = (today - date.fromisoformat(marks[country][:10])).days + 1
+            if days > backfill_days:
+                logger.warning("%s was last loaded on %s, %s days ago, beyond the %s day backfill; "
+                               "run with --backfill-days %s to fill the gap", country, marks[country], days,
+                               backfill_days, days)
+            lastdays[country] = max(1, min(days, backfill_days))
         else:
+            lastdays[country] = backfill_days
+    return lastdays
+
+def advance_high_water_marks(final_data, mode, db_file='covid_vaccine.db'):
+    """
+    Records the last date loaded per country for mode. In timeseries mode a
+    country whose loaded history does not reach back to its mark keeps the
+    old mark, so the gap is reported again until it is backfilled.
+    """
+    marks = db.get_high_water_marks(db_file, mode) if mode == 'timeseries' else {}
+    dates = final_data.assign(date=final_data['date'].astype(str)).groupby('country', observed=True)['date']
+    first, last = dates.min(), dates.max()
+    advanced = {}
+    for country in last.index:
+        mark = marks.get(country)
+        if mark and first[country] > (date.fromisoformat(mark[:10]) + timedelta(days=1)).isoformat():
+            logger.warning("%s history starts on %s, leaving a gap after %s; its high-water mark is kept",
+                           country, first[country], mark)
+            continue
+        advanced[str(country)] = last[country]
+    db.set_high_water_marks(advanced, db_file, mode)
+
+def build_sinks(db_file='covid_vaccine.db', parquet_dir=None, postgres_dsn=None):
+    """
+    Returns the load_data sinks for a run. SQLite is always included.
+    """
+    sinks = [{'type': 'sqlite', 'db_file': db_file, 'table_name': 'covid_vaccine_data', 'mode': 'upsert'}]
+    if parquet_dir:
+        sinks.append({'type': 'parquet', 'root_dir': parquet_dir})
+    if postgres_dsn:
+        sinks.append({'type': 'postgres', 'dsn': postgres_dsn, 'table_name': 'covid_vaccine_data', 'mode': 'upsert'})
+    return sinks
+
+def prebuild_figures(db_file='covid_vaccine.db'):
+    """
+    Prebuilds the unfiltered dashboard view for the current data version.
+    Plotting is optional for the pipeline, so failures only log a warning.
+    """
+    try:
+        import figures
+        version = figures.prebuild_default_view(db_file)
+    except Exception as e:
+        logger.warning("Could not prebuild dashboard figures: %s", e)
+        return None
+    logger.info("Prebuilt dashboard figures for data version %s", version)
+    return version
+
+def run_fingerprint(countries_list, mode, backfill_days, sinks):
+    """
+    Identifies the arguments of a run, so resuming a run_id with other
+    countries, mode or sinks does not reuse its checkpoints.
+    """
+    arguments = json.dumps([list(countries_list), mode, backfill_days, sinks], sort_keys=True, default=str)
+    return hashlib.sha256(arguments.encode()).hexdigest()
+
+def build_tasks(countries_list, metrics, sinks, max_workers=MAX_WORKERS, mode='snapshot', backfill_days=BACKFILL_DAYS,
+                db_file='covid_vaccine.db', prebuild=True, executor=None):
+    """
+    Returns the pipeline task graph: three independent extracts, the fused
+    transform that depends on all of them, the load and, if prebuild is set,
+    the prebuilt dashboard figures.
+    The extracts run their requests on executor if given, so together they
+    keep at most its max_workers requests in flight; otherwise each opens
+    its own pool of max_workers.
+    """
+    # pandas-heavy modules are imported when a run starts, not for --help
+    from load import load_data, save_country_regions
+    from transform import transform_all
+
+    lastdays = days_since_high_water_mark(countries_list, backfill_days, db_file) if mode == 'timeseries' else None
+
+    def extract_covid():
+        with metrics.stage('extract_covid', rows_in=len(countries_list)) as stage:
+            if mode == 'timeseries':
+                covid_data = fetch_covid_history(countries_list, lastdays, max_workers=max_workers, executor=executor)
+            else:
+                covid_data = fetch_covid_data(countries_list, max_workers=max_workers, executor=executor)
+            record_frames(stage, covid=covid_data)
+        save_country_regions(covid_data, db_file)
+        return covid_data
+
+    def extract_vaccine():
+        with metrics.stage('extract_vaccine', rows_in=len(countries_list)) as stage:
+            if mode == 'timeseries':
+                vaccine_data = fetch_vaccination_history(countries_list, lastdays, max_workers=max_workers, executor=executor)
+            else:
+                vaccine_data = fetch_vaccination_data(countries_list, max_workers=max_workers, executor=executor)
+            record_frames(stage, vaccine=vaccine_data)
+        return vaccine_data
+
+    def extract_population():
+        with metrics.stage('extract_population', rows_in=len(countries_list)) as stage:
+            population_data = fetch_population_data(countries_list, max_workers=max_workers, executor=executor)
+            record_frames(stage, population=population_data)
+        return population_data
+
+    def transform(covid_data, vaccine_data, population_data):
+        with metrics.stage('transform', rows_in=len(covid_data) + len(vaccine_data) + len(population_data)) as stage:
+            final_data = transform_all(covid_data, vaccine_data, population_data)
+            record_frames(stage, final=final_data)
+        return final_data
+
+    def load(final_data):
+        if final_data.empty:
             logger.error("No data to load into database - final dataset is empty")
+            return None
+        with metrics.stage('load', rows_in=len(final_data)) as stage:
+            results = load_data(final_data, sinks)
+            stage['load_counts'] = results
+        advance_high_water_marks(final_data, mode, db_file)
+        return results['sqlite']
+
+    def prebuild_view(counts):
+        if counts is None:
+            return None
+        with metrics.stage('prebuild_figures'):
+            return prebuild_figures(db_file)
+
+    tasks = [
+        Task('extract_covid', extract_covid),
+        Task('extract_vaccine', extract_vaccine),
+        Task('extract_population', extract_population),
+        Task('transform', transform, deps=['extract_covid', 'extract_vaccine', 'extract_population']),
+        Task('load', load, deps=['transform']),
+    ]
+    if prebuild:
+        tasks.append(Task('prebuild_figures', prebuild_view, deps=['load']))
+    return tasks
+
+def stream_pipeline(countries_list, metrics, max_workers=MAX_WORKERS, mode='snapshot', backfill_days=BACKFILL_DAYS,
+                    db_file='covid_vaccine.db', chunk_size=BATCH_SIZE, sinks=None, prebuild=True):
+    """
+    Extracts, transforms and loads chunk_size countries at a time, committing
+    each chunk before moving on. Peak memory is bounded by the chunk size.
+    """
+    from load import load_data, save_country_regions
+    from transform import transform_all
+
+    sinks = sinks or build_sinks(db_file)
+    lastdays = days_since_high_water_mark(countries_list, backfill_days, db_file) if mode == 'timeseries' else backfill_days
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+    with metrics.stage('stream', rows_in=len(countries_list)) as stage:
+        started = time.perf_counter()
+        chunks = iter_data_chunks(countries_list, chunk_size, mode, lastdays, max_workers)
+        for index, (covid_data, vaccine_data, population_data) in enumerate(chunks):
+            save_country_regions(covid_data, db_file)
+            final_data = transform_all(covid_data, vaccine_data, population_data)
+            if final_data.empty:
+                logger.warning("Chunk %s produced no rows", index)
+                continue
+            counts = load_data(final_data, sinks)['sqlite']
+            advance_high_water_marks(final_data, mode, db_file)
+            for key in totals:
+                totals[key] += counts[key]
+            stage['rows_out'] = (stage.get('rows_out') or 0) + len(final_data)
+            stage.setdefault('first_commit_s', round(time.perf_counter() - started, 4))
+            stage['chunks'] = index + 1
+            logger.info("Chunk %s loaded: %s", index, counts)
+        stage['load_counts'] = totals
+
+    logger.info("Streaming load completed: %s", totals)
+    if prebuild and stage.get('rows_out'):
+        with metrics.stage('prebuild_figures'):
+            prebuild_figures(db_file)
+
+def orchestrate_pipeline(countries_list, max_workers=MAX_WORKERS, mode='snapshot', backfill_days=BACKFILL_DAYS,
+                         db_file='covid_vaccine.db', stream=False, chunk_size=BATCH_SIZE, parquet_dir=None, postgres_dsn=None,
+                         run_id=None, staging_dir=STAGING_DIR, prebuild=True):
+    """
+    Runs extract, transform and load for the given countries.
+    mode='snapshot' stores today's totals, mode='timeseries' stores daily
+    history, backfilling backfill_days for new countries and only the days
+    since their timeseries high-water mark for the others.
+    With stream=True countries are processed and committed chunk_size at a time.
+    Data is always loaded into SQLite, and concurrently into a partitioned
+    Parquet dataset (parquet_dir) and PostgreSQL (postgres_dsn) if given.
+    Stage outputs are checkpointed under staging_dir; passing the run_id of
+    a failed run resumes it from the last completed stage.
+    With prebuild the unfiltered dashboard view is rebuilt after the load.
+    Returns the run record saved to pipeline_runs.
+    """
+    metrics = PipelineMetrics(run_id=run_id)
+    sinks = build_sinks(db_file, parquet_dir, postgres_dsn)
+    try:
+        if stream:
+            stream_pipeline(countries_list, metrics, max_workers, mode, backfill_days, db_file, chunk_size, sinks,
+                            prebuild)
+            run = metrics.save(db_file=db_file)
+            logger.info("Pipeline run %s finished in %ss", run['run_id'], run['duration_s'], extra={'run': run})
+            return run
+
+        # Extract, transform and load as a task graph: the three extracts run
+        # in parallel on one shared request pool and every stage is
+        # checkpointed for resume
+        timings = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            tasks = build_tasks(countries_list, metrics, sinks, max_workers, mode, backfill_days, db_file, prebuild,
+                                executor)
+            outputs, _ = run_dag(tasks, run_id=metrics.run_id, staging_dir=staging_dir, timings=timings,
+                                 fingerprint=run_fingerprint(countries_list, mode, backfill_days, sinks))
+        metrics.stages.append({'stage': 'dag', 'tasks': timings})
+
+        counts = outputs['load']
+        if counts is not None:
+            logger.info("Data load completed: %s", counts)
+
+        run = metrics.save(db_file=db_file)
+        logger.info("Pipeline run %s finished in %ss", run['run_id'], run['duration_s'], extra={'run': run})
+        return run
 
     except Exception as e:
-        logger.error(f"An error occurred during the pipeline: {e}")
+        logger.error("An error occurred during the pipeline: %s", e)
+        try:
+            metrics.save(db_file=db_file, status='failed', error=str(e))
+        except Exception as save_error:
+            # Never let the metrics write hide the pipeline error
+            logger.error("Could not record the failed run: %s", save_error)
         raise  # Re-raise the exception to see the full traceback
 
 if __name__ == "__main__":
-    # List of countries (example)
-    countries_list = [
-        "USA",
-        "GBR",  # United Kingdom
-        "DEU",  # Germany
-        "FRA",  # France
-        "ITA"   # Italy
-    ]
+    log_config.setup_logging()
+
+    parser = argparse.ArgumentParser(description="Run the COVID-19 data pipeline")
+    parser.add_argument('--mode', choices=['snapshot', 'timeseries'], default='snapshot')
+    parser.add_argument('--backfill-days', type=int, default=BACKFILL_DAYS)
+    parser.add_argument('--stream', action='store_true', help="extract, transform and load in bounded chunks")
+    parser.add_argument('--chunk-size', type=int, default=BATCH_SIZE, help="countries per chunk in streaming mode")
+    parser.add_argument('--parquet-dir', help="also write a partitioned Parquet dataset to this directory")
+    parser.add_argument('--postgres-dsn', help="also bulk load into this PostgreSQL database")
+    parser.add_argument('--run-id', help="resume a failed run from its checkpoints")
+    args = parser.parse_args()
 
     # Run the pipeline
-    orchestrate_pipeline(countries_list)
+    orchestrate_pipeline(COUNTRIES, mode=args.mode, backfill_days=args.backfill_days,
+                         stream=args.stream, chunk_size=args.chunk_size, parquet_dir=args.parquet_dir,
+                         postgres_dsn=args.postgres_dsn, run_id=args.run_id)
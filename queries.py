@@ -0,0 +1,151 @@
+import sqlite3
+
+import pandas as pd
+
+# Metrics the top-N control can rank by (also whitelists ORDER BY columns)
+METRICS = {
+    'net_infection_rate': 'Net Infection Rate',
+    'infection_rate': 'Infection Rate',
+    'vaccination_rate': 'Vaccination Rate',
+    'total_cases': 'Total Cases',
+    'total_vaccinations': 'Total Vaccinations',
+}
+DEFAULT_TOP_N = 50
+
+
+def _in_clause(column, values, params):
+    params.extend(values)
+    return f"{column} IN ({', '.join('?' for _ in values)})"
+
+
+def filtered_query(countries=None, regions=None, start_date=None, end_date=None):
+    """
+    Builds the SQL (and parameters) selecting the latest row per country
+    matching the filters: from the summary table, or from the history when
+    a date range is given.
+    """
+    params = []
+    if start_date or end_date:
+        date_conditions = []
+        if start_date:
+            date_conditions.append('date >= ?')
+            params.append(start_date)
+        if end_date:
+            date_conditions.append('date <= ?')
+            params.append(end_date)
+        source = f"""
+            SELECT d.* FROM covid_vaccine_data d
+            JOIN (SELECT country, MAX(date) AS date FROM covid_vaccine_data
+                  WHERE {' AND '.join(date_conditions)} GROUP BY country) m
+              ON m.country = d.country AND m.date = d.date
+        """
+    else:
+        source = "SELECT * FROM covid_vaccine_data_latest"
+
+    conditions = []
+    if countries:
+        conditions.append(_in_clause('s.country', countries, params))
+    if regions:
+        conditions.append(_in_clause('r.continent', regions, params))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f"""
+        SELECT s.* FROM ({source}) s
+        LEFT JOIN country_regions r ON r.country = s.country
+        {where}
+    """
+    return query, params
+
+
+def read_latest(db_file, countries=None, regions=None, start_date=None, end_date=None,
+                metric='net_infection_rate', top_n=None):
+    """
+    Latest row per country matching the filters, ordered by metric and
+    limited to top_n rows, all evaluated in SQL.
+    """
+    metric = metric if metric in METRICS else 'net_infection_rate'
+    query, params = filtered_query(countries, regions, start_date, end_date)
+    query += f" ORDER BY s.{metric} DESC"
+    if top_n:
+        query += " LIMIT ?"
+        params.append(int(top_n))
+    conn = sqlite3.connect(db_file)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+
+def read_totals(db_file, countries=None, regions=None, start_date=None, end_date=None):
+    """
+    (total cases, total vaccinations) over every country matching the
+    filters. Unfiltered totals come from the precomputed totals table.
+    Returns None if nothing matches.
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        if countries or regions or start_date or end_date:
+            query, params = filtered_query(countries, regions, start_date, end_date)
+            row = conn.execute(f"SELECT SUM(total_cases), SUM(total_vaccinations) FROM ({query})", params).fetchone()
+        else:
+            row = conn.execute("SELECT total_cases, total_vaccinations FROM covid_vaccine_data_totals WHERE id = 1").fetchone()
+    finally:
+        conn.close()
+    return row if row and row[0] is not None else None
+
+
+def read_trend(db_file, countries=None, regions=None, start_date=None, end_date=None):
+    """
+    Daily totals over the selected countries and date range, aggregated in SQL.
+    """
+    params, conditions = [], []
+    if start_date:
+        conditions.append('d.date >= ?')
+        params.append(start_date)
+    if end_date:
+        conditions.append('d.date <= ?')
+        params.append(end_date)
+    if countries:
+        conditions.append(_in_clause('d.country', countries, params))
+    if regions:
+        conditions.append(_in_clause('r.continent', regions, params))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f"""
+        SELECT d.date, SUM(d.total_cases) AS total_cases, SUM(d.total_vaccinations) AS total_vaccinations
+        FROM covid_vaccine_data d
+        LEFT JOIN country_regions r ON r.country = d.country
+        {where}
+        GROUP BY d.date ORDER BY d.date
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+
+def read_region_countries(db_file, regions):
+    """
+    Countries belonging to any of the given regions.
+    """
+    params = []
+    condition = _in_clause('continent', regions, params)
+    conn = sqlite3.connect(db_file)
+    try:
+        rows = conn.execute(f"SELECT country FROM country_regions WHERE {condition}", params).fetchall()
+        return [row[0] for row in rows]
+    finally:
+        conn.close()
+
+
+def read_filter_options(db_file):
+    """
+    Country and region choices plus the stored date range, for the controls.
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        countries = [row[0] for row in conn.execute("SELECT country FROM covid_vaccine_data_latest ORDER BY country")]
+        regions = [row[0] for row in conn.execute("SELECT DISTINCT continent FROM country_regions ORDER BY continent")]
+        min_date, max_date = conn.execute("SELECT MIN(date), MAX(date) FROM covid_vaccine_data").fetchone()
+    finally:
+        conn.close()
+    return countries, regions, min_date, max_date
@@ -0,0 +1,85 @@
+import os
+import threading
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+
+import columnar_store
+
+
+def make_rows(countries, days, cases=1):
+    dates = pd.date_range('2024-01-01', periods=days).strftime('%Y-%m-%d')
+    return pd.DataFrame([
+        {'country': country, 'date': date, 'total_cases': cases, 'total_vaccinations': 10 * cases}
+        for country in countries for date in dates
+    ])
+
+
+def test_write_more_than_1024_country_dates(tmp_path):
+    countries = [f'C{i:02d}' for i in range(20)]
+    data = make_rows(countries, days=90)  # 1800 (country, date) pairs
+    columnar_store.write_dataset(data, str(tmp_path))
+
+    result = columnar_store.read_dataset(str(tmp_path))
+    assert len(result) == 1800
+    assert set(result['country']) == set(countries)
+    # One file per date, not per row
+    files = [f for _, _, names in os.walk(tmp_path) for f in names if f.endswith('.parquet')]
+    assert len(files) == 90
+
+
+def test_write_merges_into_touched_partitions(tmp_path):
+    columnar_store.write_dataset(make_rows(['USA', 'GBR'], days=3), str(tmp_path))
+    update = make_rows(['USA', 'FRA'], days=2, cases=5)
+    columnar_store.write_dataset(update, str(tmp_path))
+
+    result = columnar_store.read_dataset(str(tmp_path)).set_index(['country', 'date'])
+    assert len(result) == 3 + 3 + 2
+    assert result.loc[('USA', '2024-01-01'), 'total_cases'] == 5
+    assert result.loc[('USA', '2024-01-03'), 'total_cases'] == 1
+    assert result.loc[('GBR', '2024-01-01'), 'total_cases'] == 1
+    assert result.loc[('FRA', '2024-01-02'), 'total_cases'] == 5
+
+
+def test_read_filters_countries_and_dates(tmp_path):
+    columnar_store.write_dataset(make_rows(['USA', 'GBR', 'FRA'], days=5), str(tmp_path))
+    result = columnar_store.read_dataset(str(tmp_path), countries=['GBR'], start_date='2024-01-02',
+                                         end_date='2024-01-03')
+    assert sorted(result['date']) == ['2024-01-02', '2024-01-03']
+    assert set(result['country']) == {'GBR'}
+
+
+def test_reads_during_writes_see_whole_partitions(tmp_path):
+    columnar_store.write_dataset(make_rows(['USA', 'GBR'], days=3), str(tmp_path))
+    sizes, errors = [], []
+
+    def read():
+        for _ in range(30):
+            try:
+                sizes.append(len(columnar_store.read_dataset(str(tmp_path))))
+            except Exception as e:
+                errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for cases in range(10):
+        columnar_store.write_dataset(make_rows(['USA', 'GBR'], days=3, cases=cases), str(tmp_path))
+    reader.join()
+
+    assert not errors
+    assert set(sizes) == {6}
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [columnar_store.SWAP_LOCK, columnar_store.VERSION_FILE, columnar_store.WRITE_LOCK]
+        + [f'date=2024-01-0{day}' for day in (1, 2, 3)])
+
+
+def test_version_is_a_string_that_changes_on_write(tmp_path):
+    assert columnar_store.get_version(str(tmp_path)) is None
+    columnar_store.write_dataset(make_rows(['USA'], days=1), str(tmp_path))
+    first = columnar_store.get_version(str(tmp_path))
+    assert isinstance(first, str)
+    os.utime(tmp_path / columnar_store.VERSION_FILE, ns=(0, 0))
+    columnar_store.write_dataset(make_rows(['USA'], days=1, cases=2), str(tmp_path))
+    assert columnar_store.get_version(str(tmp_path)) != first
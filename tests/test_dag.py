@@ -0,0 +1,35 @@
+import pytest
+
+from dag import Task, run_dag
+
+
+def make_tasks(calls, fail=False):
+    def extract():
+        calls.append('extract')
+        return 2
+
+    def transform(value):
+        calls.append('transform')
+        if fail:
+            raise RuntimeError("transform failed")
+        return value * 10
+
+    return [Task('extract', extract), Task('transform', transform, deps=['extract'])]
+
+
+def test_resume_reuses_checkpoints(tmp_path):
+    calls = []
+    with pytest.raises(RuntimeError):
+        run_dag(make_tasks(calls, fail=True), run_id='run', staging_dir=str(tmp_path), fingerprint='a')
+    outputs, _ = run_dag(make_tasks(calls), run_id='run', staging_dir=str(tmp_path), fingerprint='a')
+    assert outputs['transform'] == 20
+    assert calls == ['extract', 'transform', 'transform']
+    assert not (tmp_path / 'run').exists()
+
+
+def test_resume_with_other_arguments_starts_over(tmp_path):
+    calls = []
+    with pytest.raises(RuntimeError):
+        run_dag(make_tasks(calls, fail=True), run_id='run', staging_dir=str(tmp_path), fingerprint='a')
+    run_dag(make_tasks(calls), run_id='run', staging_dir=str(tmp_path), fingerprint='b')
+    assert calls == ['extract', 'transform', 'extract', 'transform']
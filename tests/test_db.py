@@ -0,0 +1,44 @@
+import sqlite3
+
+import db
+
+
+def make_legacy_db(db_file):
+    # Data from before the summary tables were introduced
+    conn = sqlite3.connect(db_file)
+    conn.execute(db.TABLE_SCHEMA.format(table='covid_vaccine_data'))
+    conn.executemany('INSERT INTO covid_vaccine_data (country, date, total_cases, total_vaccinations) VALUES (?, ?, ?, ?)',
+                     [('USA', '2024-01-01', 10, 5), ('USA', '2024-01-02', 20, 6), ('GBR', '2024-01-01', 7, 3)])
+    conn.commit()
+    conn.close()
+
+
+def read_summaries(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        latest = conn.execute('SELECT country, date FROM covid_vaccine_data_latest ORDER BY country').fetchall()
+        totals = conn.execute('SELECT total_cases, countries FROM covid_vaccine_data_totals').fetchall()
+        return latest, totals
+    finally:
+        conn.close()
+
+
+def test_summaries_of_existing_data_survive_a_read_only_caller(tmp_path):
+    db_file = str(tmp_path / 'covid.db')
+    make_legacy_db(db_file)
+
+    db.get_high_water_marks(db_file)  # opens, ensures the schema and closes without committing
+    assert read_summaries(db_file) == ([('GBR', '2024-01-01'), ('USA', '2024-01-02')], [(27, 2)])
+
+
+def test_empty_summaries_are_repopulated(tmp_path):
+    db_file = str(tmp_path / 'covid.db')
+    make_legacy_db(db_file)
+    conn = sqlite3.connect(db_file)
+    conn.execute(db.LATEST_SCHEMA.format(table='covid_vaccine_data'))
+    conn.execute(db.TOTALS_SCHEMA.format(table='covid_vaccine_data'))
+    conn.commit()
+    conn.close()
+
+    db.get_high_water_marks(db_file)
+    assert read_summaries(db_file) == ([('GBR', '2024-01-01'), ('USA', '2024-01-02')], [(27, 2)])
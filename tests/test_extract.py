@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('requests')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'benchmarks'))
+
+import extract
+import http_cache
+from fake_api import population, start_server
+
+
+@pytest.fixture
+def world_bank(monkeypatch):
+    server, base_url = start_server(['USA', 'GBR', 'DEU'])
+    monkeypatch.setattr(http_cache, 'CACHE_ENABLED', False)
+    monkeypatch.setattr(extract, 'WORLD_BANK_POPULATION_URL',
+                        base_url + '/v2/country/{}/indicator/SP.POP.TOTL?format=json&date=2022&per_page=1000')
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+def test_unknown_code_does_not_drop_its_batch(world_bank):
+    data = extract.fetch_population_data(['USA', 'XXX', 'GBR', 'DEU'], max_workers=1, batch_size=50)
+    assert dict(zip(data['country'], data['population'])) == {
+        code: population(code) for code in ['USA', 'GBR', 'DEU']
+    }
@@ -0,0 +1,91 @@
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+
+import http_cache
+import http_client
+
+
+class Handler(BaseHTTPRequestHandler):
+    hits = 0
+
+    def do_GET(self):
+        Handler.hits += 1
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, 'CACHE_FILE', str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(http_cache, 'CACHE_ENABLED', True)
+    monkeypatch.setattr(http_cache, 'OFFLINE', False)
+    monkeypatch.setattr(http_cache, '_conn', None)
+    yield
+    if http_cache._conn is not None:
+        http_cache._conn.close()
+    http_cache._conn = None
+
+
+def test_offline_replay_serves_cached_responses(server, cache, monkeypatch):
+    Handler.hits = 0
+    online = http_client.get(f'{server}/v3/covid-19/countries/USA', ttl=0)
+    assert online.status_code == 200
+
+    monkeypatch.setattr(http_cache, 'OFFLINE', True)
+    replayed = http_client.get(f'{server}/v3/covid-19/countries/USA', ttl=0)
+    assert replayed.status_code == 200
+    assert replayed.json() == online.json()
+    assert Handler.hits == 1
+
+    missing = http_client.get(f'{server}/v3/covid-19/countries/GBR')
+    assert missing.status_code == 504
+    assert Handler.hits == 1
+
+
+def test_fresh_entries_skip_the_network(server, cache):
+    Handler.hits = 0
+    http_client.get(f'{server}/a', ttl=3600)
+    assert http_client.get(f'{server}/a', ttl=3600).json() == {'path': '/a'}
+    assert Handler.hits == 1
+
+
+def test_locked_cache_falls_back_to_network(server, cache, monkeypatch):
+    monkeypatch.setattr(http_cache, 'BUSY_TIMEOUT', 0.1)
+    http_client.get(f'{server}/warm')  # creates the cache file
+
+    blocker = sqlite3.connect(http_cache.CACHE_FILE)
+    blocker.execute('BEGIN EXCLUSIVE')
+    try:
+        http_cache._conn.close()
+        http_cache._conn = None
+        Handler.hits = 0
+        response = http_client.get(f'{server}/locked')
+        assert response.status_code == 200
+        assert response.json() == {'path': '/locked'}
+        assert Handler.hits == 1
+    finally:
+        blocker.rollback()
+        blocker.close()
@@ -0,0 +1,47 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+
+import http_cache
+import http_client
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    # Retry-After values sent with a 429 before answering 200
+    retry_after = []
+
+    def do_GET(self):
+        if ThrottlingHandler.retry_after:
+            self.send_response(429)
+            self.send_header('Retry-After', ThrottlingHandler.retry_after.pop(0))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(http_cache, 'CACHE_ENABLED', False)
+    httpd = HTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_retry_after_is_honored_beyond_the_backoff_cap(server, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(http_client.time, 'sleep', sleeps.append)
+    ThrottlingHandler.retry_after = ['120', '3600']
+
+    response = http_client.get(server + '/throttled')
+    assert response.status_code == 200
+    assert sleeps == [120.0, http_client.RETRY_AFTER_MAX]
@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+import db
+from load import load_data_to_sqlite
+
+
+def frame(*rows):
+    # rows of (country, date, total_cases, total_vaccinations)
+    return pd.DataFrame([
+        {'country': country, 'date': date, 'total_cases': cases, 'total_deaths': 1, 'infection_rate': 0.5,
+         'total_vaccinations': vaccinations, 'vaccination_rate': 0.25, 'net_infection_rate': 0.25}
+        for country, date, cases, vaccinations in rows
+    ], columns=db.COLUMNS)
+
+
+def query(db_file, sql):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_upsert_counts_and_detects_null_changes(tmp_path):
+    db_file = str(tmp_path / 'covid.db')
+    first = frame(('USA', '2024-01-01', 10, None), ('GBR', '2024-01-01', 5, 2))
+    assert load_data_to_sqlite(first, db_file) == {'inserted': 2, 'updated': 0, 'unchanged': 0}
+    assert load_data_to_sqlite(first, db_file) == {'inserted': 0, 'updated': 0, 'unchanged': 2}
+
+    # NULL -> value, value -> NULL and a new key
+    second = frame(('USA', '2024-01-01', 10, 3), ('GBR', '2024-01-01', 5, None), ('FRA', '2024-01-01', 1, 1))
+    assert load_data_to_sqlite(second, db_file) == {'inserted': 1, 'updated': 2, 'unchanged': 0}
+    assert query(db_file, 'SELECT country, total_vaccinations FROM covid_vaccine_data ORDER BY country') == [
+        ('FRA', 1), ('GBR', None), ('USA', 3)]
+    version = query(db_file, 'SELECT version FROM data_version')
+
+    assert load_data_to_sqlite(second, db_file) == {'inserted': 0, 'updated': 0, 'unchanged': 3}
+    # Unchanged loads do not publish a new data version
+    assert query(db_file, 'SELECT version FROM data_version') == version
+
+
+def test_replace_swaps_in_the_new_rows(tmp_path):
+    db_file = str(tmp_path / 'covid.db')
+    load_data_to_sqlite(frame(('USA', '2024-01-01', 10, 1), ('GBR', '2024-01-01', 5, 2)), db_file)
+    load_data_to_sqlite(frame(('FRA', '2024-01-02', 7, 3)), db_file, mode='replace')
+
+    assert query(db_file, 'SELECT country, date, total_cases FROM covid_vaccine_data') == [('FRA', '2024-01-02', 7)]
+    assert query(db_file, 'SELECT country FROM covid_vaccine_data_latest') == [('FRA',)]
+    assert query(db_file, 'SELECT total_cases, countries FROM covid_vaccine_data_totals') == [(7, 1)]
+    assert query(db_file, 'SELECT version FROM data_version') == [(2,)]
+    tables = {name for name, in query(db_file, "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 'covid_vaccine_data_staging' not in tables
+    indexes = {name for name, in query(db_file, "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'idx_covid_vaccine_data_date' in indexes
+
+    # The swapped in table keeps its (country, date) key for later upserts
+    assert load_data_to_sqlite(frame(('FRA', '2024-01-02', 8, 3)), db_file) == {
+        'inserted': 0, 'updated': 1, 'unchanged': 0}
+
+
+def test_upsert_refreshes_only_the_loaded_countries_summaries(tmp_path):
+    db_file = str(tmp_path / 'covid.db')
+    load_data_to_sqlite(frame(('USA', '2024-01-01', 10, 1), ('GBR', '2024-01-01', 5, 2)), db_file)
+    # Mark GBR's summary row to show it is not recomputed by a USA load
+    conn = sqlite3.connect(db_file)
+    conn.execute("UPDATE covid_vaccine_data_latest SET total_cases = 999 WHERE country = 'GBR'")
+    conn.commit()
+    conn.close()
+
+    load_data_to_sqlite(frame(('USA', '2024-01-02', 20, 4)), db_file)
+
+    assert query(db_file, 'SELECT country, date, total_cases FROM covid_vaccine_data_latest ORDER BY country') == [
+        ('GBR', '2024-01-01', 999), ('USA', '2024-01-02', 20)]
+    assert query(db_file, 'SELECT total_cases, total_vaccinations, countries, latest_date '
+                          'FROM covid_vaccine_data_totals') == [(1019, 6, 2, '2024-01-02')]
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('requests')
+
+import db
+import orchestrator
+
+
+def days_ago(days):
+    return (date.today() - timedelta(days=days)).isoformat()
+
+
+def frame(country, *dates):
+    return pd.DataFrame({'country': [country] * len(dates), 'date': list(dates)})
+
+
+def test_snapshot_loads_do_not_move_the_timeseries_mark(tmp_path):
+    db_file = str(tmp_path / 'covid.db')
+    orchestrator.advance_high_water_marks(frame('USA', days_ago(10), days_ago(5)), 'timeseries', db_file)
+    orchestrator.advance_high_water_marks(frame('USA', days_ago(0)), 'snapshot', db_file)
+
+    assert db.get_high_water_marks(db_file, 'timeseries') == {'USA': days_ago(5)}
+    assert db.get_high_water_marks(db_file, 'snapshot') == {'USA': days_ago(0)}
+    assert orchestrator.days_since_high_water_mark(['USA', 'GBR'], 90, db_file) == {'USA': 6, 'GBR': 90}
+
+
+def test_gap_beyond_backfill_is_reported_until_filled(tmp_path, caplog):
+    db_file = str(tmp_path / 'covid.db')
+    orchestrator.advance_high_water_marks(frame('USA', days_ago(40)), 'timeseries', db_file)
+
+    assert orchestrator.days_since_high_water_mark(['USA'], 7, db_file) == {'USA': 7}
+    assert "--backfill-days 41" in caplog.text
+
+    # Loading only the backfill window keeps the mark before the gap
+    orchestrator.advance_high_water_marks(frame('USA', days_ago(6), days_ago(0)), 'timeseries', db_file)
+    assert db.get_high_water_marks(db_file) == {'USA': days_ago(40)}
+
+    orchestrator.advance_high_water_marks(frame('USA', days_ago(40), days_ago(0)), 'timeseries', db_file)
+    assert db.get_high_water_marks(db_file) == {'USA': days_ago(0)}
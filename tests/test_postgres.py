@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+PG_DSN = os.environ.get('PG_DSN')
+pytestmark = pytest.mark.skipif(not PG_DSN, reason="set PG_DSN to a scratch PostgreSQL database")
+
+pd = pytest.importorskip('pandas')
+psycopg2 = pytest.importorskip('psycopg2')
+
+import load
+
+TABLE = 'test_covid_vaccine_data'
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['country', 'date', 'total_cases', 'total_deaths', 'infection_rate',
+                                       'total_vaccinations', 'vaccination_rate', 'net_infection_rate'])
+
+
+def fetch_all():
+    conn = psycopg2.connect(PG_DSN)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'SELECT country, date::text, total_cases FROM {TABLE} ORDER BY country, date')
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture(autouse=True)
+def clean_table():
+    conn = psycopg2.connect(PG_DSN)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}, {TABLE}_staging, {TABLE}_old')
+    yield
+    load.close_pg_pools()
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}, {TABLE}_staging, {TABLE}_old')
+    conn.close()
+
+
+def test_upsert_counts_inserted_updated_unchanged():
+    first = frame([('USA', '2024-01-01', 10, 1, 0.1, 100, 1.0, 0.9),
+                   ('GBR', '2024-01-01', 20, 2, 0.2, 200, 2.0, 1.8)])
+    assert load.save_to_postgres(first, PG_DSN, TABLE) == {'inserted': 2, 'updated': 0, 'unchanged': 0}
+
+    second = frame([('USA', '2024-01-01', 11, 1, 0.1, 100, 1.0, 0.9),
+                    ('GBR', '2024-01-01', 20, 2, 0.2, 200, 2.0, 1.8),
+                    ('FRA', '2024-01-01', 30, 3, 0.3, 300, 3.0, 2.7)])
+    assert load.save_to_postgres(second, PG_DSN, TABLE) == {'inserted': 1, 'updated': 1, 'unchanged': 1}
+    assert fetch_all() == [('FRA', '2024-01-01', 30), ('GBR', '2024-01-01', 20), ('USA', '2024-01-01', 11)]
+
+
+def test_replace_copies_and_swaps_table():
+    load.save_to_postgres(frame([('USA', '2024-01-01', 10, 1, 0.1, 100, 1.0, 0.9)]), PG_DSN, TABLE)
+    rows = frame([('GBR', '2024-01-02', 20, None, None, 200, 2.0, None),
+                  ('FRA', '2024-01-02', 30, 3, 0.3, None, None, None)])
+    for _ in range(2):  # the swapped-in table must support the next swap
+        assert load.save_to_postgres(rows, PG_DSN, TABLE, mode='replace') is None
+        assert fetch_all() == [('FRA', '2024-01-02', 30), ('GBR', '2024-01-02', 20)]
+
+    # The primary key survives the swap, so upserts keep working
+    counts = load.save_to_postgres(frame([('GBR', '2024-01-02', 21, None, None, 200, 2.0, None)]), PG_DSN, TABLE)
+    assert counts == {'inserted': 0, 'updated': 1, 'unchanged': 0}
@@ -0,0 +1,29 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from transform import transform_all, INTEGER_COLUMNS, INTEGER_DTYPE
+
+
+def batch(country, date, cases):
+    covid = pd.DataFrame([{'country': country, 'date': date, 'total_confirmed': cases, 'total_deaths': 1}])
+    vaccine = pd.DataFrame([{'country': country, 'date': date, 'total_vaccinations': cases}])
+    population = pd.DataFrame([{'country': country, 'population': 10 ** 9}])
+    return transform_all(covid, vaccine, population)
+
+
+def test_count_dtypes_do_not_depend_on_the_values():
+    small, large = batch('USA', '2024-01-01', 5), batch('CHN', '2024-01-02', 10 ** 10)
+    for final_data in (small, large):
+        assert all(final_data[column].dtype == INTEGER_DTYPE for column in INTEGER_COLUMNS)
+    assert large['total_vaccinations'].iloc[0] == 10 ** 10
+
+
+def test_parquet_dataset_reads_back_across_batches(tmp_path):
+    pytest.importorskip('pyarrow')
+    import columnar_store
+
+    columnar_store.write_dataset(batch('USA', '2024-01-01', 5), str(tmp_path))
+    columnar_store.write_dataset(batch('CHN', '2024-01-02', 10 ** 10), str(tmp_path))
+    result = columnar_store.read_dataset(str(tmp_path)).set_index('country')
+    assert result.loc['CHN', 'total_cases'] == 10 ** 10
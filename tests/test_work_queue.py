@@ -0,0 +1,93 @@
+import multiprocessing
+
+import work_queue
+
+
+def enqueue(queue_file, shards=1):
+    work_queue.enqueue('job', {f'shard-{i}': [f'C{i}'] for i in range(shards)}, queue_file=queue_file)
+
+
+def test_claim_complete(tmp_path):
+    queue_file = str(tmp_path / 'queue.db')
+    enqueue(queue_file)
+    task = work_queue.claim('job', 'w1', queue_file)
+    assert task['countries'] == ['C0'] and task['attempts'] == 1
+    assert work_queue.claim('job', 'w2', queue_file) is None
+    assert work_queue.complete(task['task_id'], 'w1', {'rows': 1}, queue_file)
+    assert work_queue.job_status('job', queue_file) == {'done': 1}
+    assert work_queue.job_results('job', queue_file)[0]['result'] == {'rows': 1}
+
+
+def test_failed_task_is_retried_until_max_attempts(tmp_path):
+    queue_file = str(tmp_path / 'queue.db')
+    enqueue(queue_file)
+    for attempt in range(1, work_queue.MAX_ATTEMPTS + 1):
+        task = work_queue.claim('job', 'w1', queue_file)
+        assert task['attempts'] == attempt
+        assert work_queue.fail(task['task_id'], 'w1', 'boom', queue_file)
+    assert work_queue.claim('job', 'w1', queue_file) is None
+    assert work_queue.job_status('job', queue_file) == {'failed': 1}
+
+    assert work_queue.retry_failed('job', queue_file) == 1
+    assert work_queue.claim('job', 'w1', queue_file)['attempts'] == 1
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_rejected(tmp_path):
+    queue_file = str(tmp_path / 'queue.db')
+    enqueue(queue_file)
+    first = work_queue.claim('job', 'w1', queue_file)
+    # Within the lease nobody else gets the task
+    assert work_queue.claim('job', 'w2', queue_file) is None
+
+    second = work_queue.claim('job', 'w2', queue_file, lease_seconds=-1)
+    assert second['task_id'] == first['task_id'] and second['attempts'] == 2
+    assert not work_queue.heartbeat(first['task_id'], 'w1', queue_file)
+    assert not work_queue.complete(first['task_id'], 'w1', None, queue_file)
+    assert not work_queue.fail(first['task_id'], 'w1', 'late', queue_file)
+    assert work_queue.complete(second['task_id'], 'w2', None, queue_file)
+    assert work_queue.job_status('job', queue_file) == {'done': 1}
+
+
+def test_heartbeat_extends_lease(tmp_path):
+    queue_file = str(tmp_path / 'queue.db')
+    enqueue(queue_file)
+    task = work_queue.claim('job', 'w1', queue_file)
+    conn = work_queue.connect(queue_file)
+    conn.execute('UPDATE work_queue SET heartbeat_at = heartbeat_at - 1000')
+    conn.close()
+    assert work_queue.heartbeat(task['task_id'], 'w1', queue_file)
+    assert work_queue.claim('job', 'w2', queue_file, lease_seconds=500) is None
+
+
+def test_crash_on_last_attempt_fails_task(tmp_path):
+    queue_file = str(tmp_path / 'queue.db')
+    enqueue(queue_file)
+    for _ in range(work_queue.MAX_ATTEMPTS):
+        # Each worker dies without completing, failing or heartbeating
+        assert work_queue.claim('job', 'crashing', queue_file, lease_seconds=-1) is not None
+    assert work_queue.claim('job', 'w2', queue_file, lease_seconds=-1) is None
+    assert work_queue.job_status('job', queue_file) == {'failed': 1}
+    assert work_queue.job_results('job', queue_file)[0]['error'] == 'lease expired on last attempt'
+
+
+def _drain(queue_file, worker, results):
+    claimed = []
+    while (task := work_queue.claim('job', worker, queue_file)) is not None:
+        claimed.append(task['task_id'])
+        work_queue.complete(task['task_id'], worker, None, queue_file)
+    results.put(claimed)
+
+
+def test_concurrent_workers_claim_each_task_once(tmp_path):
+    queue_file = str(tmp_path / 'queue.db')
+    enqueue(queue_file, shards=100)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=_drain, args=(queue_file, f'w{i}', results)) for i in range(4)]
+    for process in processes:
+        process.start()
+    claimed = [task_id for _ in processes for task_id in results.get(timeout=60)]
+    for process in processes:
+        process.join()
+    assert sorted(claimed) == list(range(1, 101))
+    assert work_queue.job_status('job', queue_file) == {'done': 100}
@@ -0,0 +1,48 @@
+import multiprocessing
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('requests')
+
+import workers
+
+
+def test_retry_resumes_from_previous_attempt_checkpoints(tmp_path):
+    previous = tmp_path / 'job-7-1'
+    previous.mkdir()
+    (previous / 'extract_covid.pkl').write_bytes(b'data')
+    (previous / 'transform.pkl.tmp').write_bytes(b'partial')
+
+    run_id = workers._seed_checkpoints('job', {'task_id': 7, 'attempts': 2}, staging_dir=str(tmp_path))
+    assert run_id == 'job-7-2'
+    assert (tmp_path / run_id / 'extract_covid.pkl').read_bytes() == b'data'
+    assert not (tmp_path / run_id / 'transform.pkl.tmp').exists()
+    # The previous attempt's directory is left alone
+    assert (previous / 'extract_covid.pkl').exists()
+
+
+def _save_shard(country, root_dir):
+    from load import save_to_parquet
+    save_to_parquet(pd.DataFrame([{'country': country, 'date': '2024-01-01', 'total_cases': 1}]), root_dir)
+
+
+def test_concurrent_workers_keep_every_shard_in_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+    import columnar_store
+
+    context = multiprocessing.get_context('spawn')  # as run_job starts its workers
+    countries = ['USA', 'GBR', 'DEU', 'FRA']
+    processes = [context.Process(target=_save_shard, args=(country, str(tmp_path))) for country in countries]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    assert sorted(columnar_store.read_dataset(str(tmp_path))['country']) == sorted(countries)
+
+
+def test_shard_by_batch():
+    shards = workers.shard_countries(['A', 'B', 'C'], shard_by='batch', shard_size=2)
+    assert shards == {'batch-0': ['A', 'B'], 'batch-1': ['C']}
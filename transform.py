@@ -1,5 +1,10 @@
+import logging
+
 import pandas as pd
 
+# Set up logging
+logger = logging.getLogger(__name__)
+
 def transform_covid_data(covid_data, population_data):
     """
     Transforms and merges COVID-19 and population data into a single DataFrame.
@@ -21,7 +26,7 @@ def transform_covid_data(covid_data, population_data):
         'country': 'country'
     })
 
-    print("COVID data transformed and merged successfully.")
+    logger.debug("COVID data transformed and merged successfully.")
     return covid_data
 
 def transform_vaccine_data(vaccine_data, population_data):
@@ -37,22 +42,76 @@ def transform_vaccine_data(vaccine_data, population_data):
     # Filter out countries with missing vaccination data or population
     vaccine_data = vaccine_data.dropna(subset=['total_vaccinations', 'population'])
 
-    print("Vaccination data transformed and merged successfully.")
+    logger.debug("Vaccination data transformed and merged successfully.")
     return vaccine_data
 
 def final_transformation(covid_data, vaccine_data):
     """
     Merges the transformed COVID data and vaccine data into a final dataset.
     """
-    # Merge the two datasets on the 'country' column
-    final_data = pd.merge(covid_data, vaccine_data, on="country", how="inner")
+    # Merge the two datasets on the 'country' column, and on 'date' as well
+    # when both carry time series
+    keys = ['country', 'date'] if 'date' in vaccine_data.columns else ['country']
+    final_data = pd.merge(covid_data, vaccine_data, on=keys, how="inner")
     
     # Calculate the net infection rate (COVID-19 cases minus vaccinated)
     final_data['net_infection_rate'] = final_data['infection_rate'] - final_data['vaccination_rate']
     
     # Filter and sort data based on net infection rate for better insights
-    final_data = final_data[['country', 'total_cases', 'total_deaths', 'infection_rate', 'total_vaccinations', 'vaccination_rate', 'net_infection_rate']]
+    final_data = final_data[['country', 'date', 'total_cases', 'total_deaths', 'infection_rate', 'total_vaccinations', 'vaccination_rate', 'net_infection_rate']]
+    final_data = final_data.sort_values(by='net_infection_rate', ascending=False)
+
+    logger.debug("Final transformation completed.")
+    return final_data
+
+FINAL_COLUMNS = ['country', 'date', 'total_cases', 'total_deaths', 'infection_rate', 'total_vaccinations', 'vaccination_rate', 'net_infection_rate']
+# Count columns have one fixed dtype in every batch, chunk and shard so the
+# schemas persisted by the sinks stay stable. Cumulative counts exceed int32.
+INTEGER_COLUMNS = ['total_cases', 'total_deaths', 'total_vaccinations']
+INTEGER_DTYPE = 'int64'
+
+def _cast_integers(data, columns):
+    """
+    Casts the integer count columns to INTEGER_DTYPE.
+    """
+    return data.astype({column: INTEGER_DTYPE for column in columns})
+
+def transform_all(covid_data, vaccine_data, population_data):
+    """
+    Fused equivalent of transform_covid_data, transform_vaccine_data and
+    final_transformation. All sources are aligned on one categorical country
+    index, joined once, and the rates are computed in a single vectorized pass.
+    """
+    if covid_data.empty or vaccine_data.empty or population_data.empty:
+        logger.debug("Final transformation completed.")
+        return pd.DataFrame(columns=FINAL_COLUMNS)
+
+    # Population per country, its index defines the country categories
+    population = population_data.dropna(subset=['population']).drop_duplicates('country').set_index('country')['population']
+    countries = pd.CategoricalDtype(population.index)
+
+    # Countries without population become NaN and are dropped with the missing values
+    covid = covid_data.assign(country=covid_data['country'].astype(countries))
+    covid = covid.dropna(subset=['country', 'total_confirmed', 'total_deaths'])
+    vaccine = vaccine_data.assign(country=vaccine_data['country'].astype(countries))
+    vaccine = vaccine.dropna(subset=['country', 'total_vaccinations'])
+
+    # Single join on the shared categorical codes (plus date for time series)
+    keys = ['country', 'date'] if 'date' in vaccine.columns and 'date' in covid.columns else ['country']
+    final_data = covid.merge(vaccine, on=keys, how='inner')
+
+    # Vectorized rates, population looked up by category code
+    population_values = population.to_numpy(dtype='float64')[final_data['country'].cat.codes.to_numpy()]
+    infection_rate = final_data['total_confirmed'].to_numpy(dtype='float64') / population_values * 100
+    vaccination_rate = final_data['total_vaccinations'].to_numpy(dtype='float64') / population_values * 100
+
+    final_data = final_data.rename(columns={'total_confirmed': 'total_cases'})
+    final_data['infection_rate'] = infection_rate
+    final_data['vaccination_rate'] = vaccination_rate
+    final_data['net_infection_rate'] = infection_rate - vaccination_rate
+
+    final_data = _cast_integers(final_data[FINAL_COLUMNS], INTEGER_COLUMNS)
     final_data = final_data.sort_values(by='net_infection_rate', ascending=False)
 
-    print("Final transformation completed.")
+    logger.debug("Final transformation completed.")
     return final_data
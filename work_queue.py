@@ -0,0 +1,211 @@
+import json
+import sqlite3
+import time
+
+# The queue lives in its own SQLite file so that claiming tasks never
+# contends with the data loads
+QUEUE_FILE = 'work_queue.db'
+
+# A running task whose worker sent no heartbeat within the lease is assumed
+# lost (worker crashed) and handed out again, at most MAX_ATTEMPTS times in
+# total. Workers heartbeat every HEARTBEAT_SECONDS while running a task.
+LEASE_SECONDS = 600
+HEARTBEAT_SECONDS = 60
+MAX_ATTEMPTS = 3
+
+QUEUE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS work_queue (
+        task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        shard TEXT NOT NULL,
+        countries TEXT NOT NULL,
+        mode TEXT NOT NULL,
+        backfill_days INTEGER,
+        status TEXT NOT NULL DEFAULT 'pending',
+        worker TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        claimed_at REAL,
+        heartbeat_at REAL,
+        finished_at REAL,
+        result TEXT,
+        error TEXT
+    )
+'''
+
+QUEUE_INDEX_SCHEMA = '''
+    CREATE INDEX IF NOT EXISTS idx_work_queue_job_status ON work_queue (job_id, status)
+'''
+
+
+def connect(queue_file=QUEUE_FILE):
+    """
+    Opens the queue in autocommit mode; claims use explicit immediate
+    transactions so two workers never get the same task.
+    """
+    conn = sqlite3.connect(queue_file, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(QUEUE_SCHEMA)
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(work_queue)')]
+    if 'heartbeat_at' not in columns:
+        conn.execute('ALTER TABLE work_queue ADD COLUMN heartbeat_at REAL')
+    conn.execute(QUEUE_INDEX_SCHEMA)
+    return conn
+
+
+def enqueue(job_id, shards, mode='snapshot', backfill_days=None, queue_file=QUEUE_FILE):
+    """
+    Adds one pending task per shard, a {shard name: [countries]} dict.
+    Timeseries tasks fetch from each country's high-water mark at run time,
+    backfilling backfill_days for new countries.
+    Returns the number of tasks added.
+    """
+    conn = connect(queue_file)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany(
+            'INSERT INTO work_queue (job_id, shard, countries, mode, backfill_days) VALUES (?, ?, ?, ?, ?)',
+            [(job_id, shard, json.dumps(countries), mode, backfill_days) for shard, countries in shards.items()]
+        )
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    return len(shards)
+
+
+def _to_task(row):
+    task_id, shard, countries, mode, backfill_days, attempts = row
+    return {'task_id': task_id, 'shard': shard, 'countries': json.loads(countries), 'mode': mode,
+            'backfill_days': backfill_days, 'attempts': attempts}
+
+
+def claim(job_id, worker, queue_file=QUEUE_FILE, lease_seconds=LEASE_SECONDS):
+    """
+    Atomically claims the next pending task of job_id (or a running one
+    whose lease expired) for worker. Expired tasks that used all their
+    attempts are marked failed. Returns the task dict, or None when there
+    is nothing left to claim.
+    """
+    now = time.time()
+    conn = connect(queue_file)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('''
+            UPDATE work_queue SET status = 'failed', finished_at = ?, error = 'lease expired on last attempt'
+            WHERE job_id = ? AND status = 'running' AND heartbeat_at < ? AND attempts >= ?
+        ''', (now, job_id, now - lease_seconds, MAX_ATTEMPTS))
+        row = conn.execute('''
+            SELECT task_id, shard, countries, mode, backfill_days, attempts FROM work_queue
+            WHERE job_id = ? AND attempts < ?
+              AND (status = 'pending' OR (status = 'running' AND heartbeat_at < ?))
+            ORDER BY task_id LIMIT 1
+        ''', (job_id, MAX_ATTEMPTS, now - lease_seconds)).fetchone()
+        if row is None:
+            conn.execute('COMMIT')
+            return None
+        conn.execute('''
+            UPDATE work_queue SET status = 'running', worker = ?, attempts = attempts + 1, claimed_at = ?,
+                heartbeat_at = ?
+            WHERE task_id = ?
+        ''', (worker, now, now, row[0]))
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    task = _to_task(row)
+    task['attempts'] += 1
+    return task
+
+
+def heartbeat(task_id, worker, queue_file=QUEUE_FILE):
+    """
+    Extends the lease of a running task. Returns False if worker no longer
+    owns the task (its lease expired and it was handed out again).
+    """
+    conn = connect(queue_file)
+    try:
+        cursor = conn.execute(
+            "UPDATE work_queue SET heartbeat_at = ? WHERE task_id = ? AND worker = ? AND status = 'running'",
+            (time.time(), task_id, worker)
+        )
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def complete(task_id, worker, result=None, queue_file=QUEUE_FILE):
+    """
+    Marks a task of worker done, storing its JSON-serializable result.
+    Returns False if worker no longer owns the task.
+    """
+    conn = connect(queue_file)
+    try:
+        cursor = conn.execute('''
+            UPDATE work_queue SET status = 'done', finished_at = ?, result = ?, error = NULL
+            WHERE task_id = ? AND worker = ? AND status = 'running'
+        ''', (time.time(), json.dumps(result, default=str), task_id, worker))
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def fail(task_id, worker, error, queue_file=QUEUE_FILE):
+    """
+    Records a failed attempt of worker. The task goes back to pending until
+    it has used MAX_ATTEMPTS attempts, then stays failed.
+    Returns False if worker no longer owns the task.
+    """
+    conn = connect(queue_file)
+    try:
+        cursor = conn.execute('''
+            UPDATE work_queue
+            SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END,
+                finished_at = ?, error = ?
+            WHERE task_id = ? AND worker = ? AND status = 'running'
+        ''', (MAX_ATTEMPTS, time.time(), str(error), task_id, worker))
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def retry_failed(job_id, queue_file=QUEUE_FILE, lease_seconds=LEASE_SECONDS):
+    """
+    Puts the failed tasks of job_id, and running ones whose lease expired,
+    back to pending with fresh attempts. Returns the number of tasks reset.
+    """
+    conn = connect(queue_file)
+    try:
+        cursor = conn.execute('''
+            UPDATE work_queue SET status = 'pending', attempts = 0
+            WHERE job_id = ? AND (status = 'failed' OR (status = 'running' AND heartbeat_at < ?))
+        ''', (job_id, time.time() - lease_seconds))
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def job_status(job_id, queue_file=QUEUE_FILE):
+    """
+    Returns {status: task count} for job_id.
+    """
+    conn = connect(queue_file)
+    try:
+        rows = conn.execute('SELECT status, COUNT(*) FROM work_queue WHERE job_id = ? GROUP BY status', (job_id,))
+        return dict(rows.fetchall())
+    finally:
+        conn.close()
+
+
+def job_results(job_id, queue_file=QUEUE_FILE):
+    """
+    Returns the tasks of job_id with their status, worker, result and error.
+    """
+    conn = connect(queue_file)
+    try:
+        rows = conn.execute('''
+            SELECT task_id, shard, status, worker, attempts, result, error FROM work_queue
+            WHERE job_id = ? ORDER BY task_id
+        ''', (job_id,)).fetchall()
+    finally:
+        conn.close()
+    return [{'task_id': task_id, 'shard': shard, 'status': status, 'worker': worker, 'attempts': attempts,
+             'result': json.loads(result) if result else None, 'error': error}
+            for task_id, shard, status, worker, attempts, result, error in rows]
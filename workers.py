@@ -0,0 +1,241 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+
+import db
+import http_client
+import log_config
+import work_queue
+from dag import STAGING_DIR
+from extract import MAX_WORKERS, BACKFILL_DAYS, BATCH_SIZE
+from orchestrator import COUNTRIES, orchestrate_pipeline, prebuild_figures
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+
+def shard_countries(countries_list, shard_by='batch', shard_size=BATCH_SIZE, db_file='covid_vaccine.db'):
+    """
+    Splits the countries into shards, a {shard name: [countries]} dict.
+    shard_by='batch' cuts shard_size countries at a time, shard_by='region'
+    groups them by continent (from country_regions, filled by earlier runs)
+    and batches the countries without a known region.
+    """
+    shards = {}
+    if shard_by == 'region':
+        try:
+            conn = sqlite3.connect(db_file)
+            try:
+                regions = dict(conn.execute('SELECT country, continent FROM country_regions'))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            regions = {}
+        for country in countries_list:
+            if regions.get(country):
+                shards.setdefault(regions[country], []).append(country)
+        countries_list = [c for c in countries_list if not regions.get(c)]
+
+    for start in range(0, len(countries_list), shard_size):
+        shards[f'batch-{start // shard_size}'] = countries_list[start:start + shard_size]
+    return shards
+
+
+@contextmanager
+def _heartbeat(task_id, worker, queue_file):
+    """
+    Keeps extending the lease of the task while the block runs.
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(work_queue.HEARTBEAT_SECONDS):
+            try:
+                if not work_queue.heartbeat(task_id, worker, queue_file):
+                    logger.warning("Worker %s lost the lease on task %s", worker, task_id)
+                    return
+            except sqlite3.Error as e:
+                logger.warning("Heartbeat for task %s failed: %s", task_id, e)
+
+    thread = threading.Thread(target=beat, name=f'heartbeat-{task_id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _seed_checkpoints(job_id, task, staging_dir=STAGING_DIR):
+    """
+    Returns the run id of this attempt of task, <job_id>-<task_id>-<attempt>.
+    Every attempt checkpoints into its own directory, seeded with a copy of
+    the previous attempt's checkpoints so a retry resumes where it stopped.
+    """
+    run_id = f"{job_id}-{task['task_id']}-{task['attempts']}"
+    for attempt in range(task['attempts'] - 1, 0, -1):
+        previous = os.path.join(staging_dir, f"{job_id}-{task['task_id']}-{attempt}")
+        if os.path.isdir(previous):
+            shutil.copytree(previous, os.path.join(staging_dir, run_id), dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns('*.tmp'))
+            break
+    return run_id
+
+
+def run_worker(job_id, db_file='covid_vaccine.db', queue_file=work_queue.QUEUE_FILE, max_workers=MAX_WORKERS,
+               rate_share=1.0, parquet_dir=None, postgres_dsn=None, worker=None):
+    """
+    Claims and runs tasks of job_id until none are left, heartbeating while
+    a task runs. Each task is an ordinary pipeline run over its shard's
+    countries (a retried task resumes from the checkpoints of its previous
+    attempt); the dashboard figures are left to the coordinator.
+    Returns the number of tasks completed.
+    """
+    log_config.setup_logging()
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    http_client.set_rate_share(rate_share)
+    completed = 0
+    while True:
+        task = work_queue.claim(job_id, worker, queue_file)
+        if task is None:
+            break
+        logger.info("Worker %s running shard %s (%d countries, attempt %d)", worker, task['shard'],
+                    len(task['countries']), task['attempts'], extra={'job_id': job_id, 'task_id': task['task_id']})
+        try:
+            with _heartbeat(task['task_id'], worker, queue_file):
+                run = orchestrate_pipeline(task['countries'], max_workers=max_workers, mode=task['mode'],
+                                           backfill_days=task['backfill_days'] or BACKFILL_DAYS, db_file=db_file,
+                                           parquet_dir=parquet_dir, postgres_dsn=postgres_dsn,
+                                           run_id=_seed_checkpoints(job_id, task), prebuild=False)
+        except Exception as e:
+            logger.error("Worker %s failed shard %s: %s", worker, task['shard'], e)
+            if not work_queue.fail(task['task_id'], worker, e, queue_file):
+                logger.warning("Worker %s no longer owns task %s, failure not recorded", worker, task['task_id'])
+            continue
+        result = {'run_id': run['run_id'], 'duration_s': run['duration_s']}
+        if not work_queue.complete(task['task_id'], worker, result, queue_file):
+            logger.warning("Worker %s no longer owns task %s, result not recorded", worker, task['task_id'])
+            continue
+        for attempt in range(1, task['attempts']):
+            shutil.rmtree(os.path.join(STAGING_DIR, f"{job_id}-{task['task_id']}-{attempt}"), ignore_errors=True)
+        completed += 1
+    logger.info("Worker %s finished: %s tasks completed", worker, completed)
+    return completed
+
+
+def finalize(db_file='covid_vaccine.db', table_name='covid_vaccine_data'):
+    """
+    Rebuilds the summary tables over all shards, publishes a new data
+    version and prebuilds the dashboard figures.
+    """
+    conn = db.connect(db_file)
+    conn.isolation_level = None
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        db.ensure_schema(conn, table_name)
+        db.refresh_summaries(conn, table_name)
+        db.bump_data_version(conn)
+        conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    prebuild_figures(db_file)
+
+
+def run_job(countries_list, workers=DEFAULT_WORKERS, shard_by='batch', shard_size=BATCH_SIZE, mode='snapshot',
+            backfill_days=BACKFILL_DAYS, db_file='covid_vaccine.db', queue_file=work_queue.QUEUE_FILE,
+            max_workers=None, parquet_dir=None, postgres_dsn=None, job_id=None):
+    """
+    Coordinates a sharded pipeline run: enqueues the shards (unless job_id
+    names an existing job, which is resumed), starts workers local worker
+    processes, waits for them and finalizes the summary data.
+    More workers on the same machine can join with
+    `python workers.py worker --job-id`. The queue and database are SQLite
+    files in WAL mode, which must not be shared over a network filesystem.
+    The HTTP rate limits and thread pools are split between the workers.
+    Workers write parquet_dir concurrently; columnar_store serializes their
+    partition merges with a file lock.
+    Returns {status: task count} for the job.
+    """
+    job_id = job_id or uuid.uuid4().hex[:12]
+    if work_queue.job_status(job_id, queue_file):
+        reset = work_queue.retry_failed(job_id, queue_file)
+        logger.info("Resuming job %s, %s failed tasks reset", job_id, reset)
+    else:
+        shards = shard_countries(countries_list, shard_by, shard_size, db_file)
+        work_queue.enqueue(job_id, shards, mode, backfill_days, queue_file)
+        logger.info("Job %s: %s shards queued for %s workers", job_id, len(shards), workers)
+
+    # Make sure the schema exists before workers race to create it
+    conn = db.connect(db_file)
+    try:
+        db.ensure_schema(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+    max_workers = max_workers or max(1, MAX_WORKERS // workers)
+    context = multiprocessing.get_context('spawn')  # fresh sessions and connections per worker
+    processes = [
+        context.Process(target=run_worker, args=(job_id, db_file, queue_file, max_workers, 1 / workers,
+                                                 parquet_dir, postgres_dsn))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    status = work_queue.job_status(job_id, queue_file)
+    if status.get('done'):
+        finalize(db_file)
+    if set(status) - {'done'}:
+        logger.error("Job %s incomplete: %s", job_id, status)
+    else:
+        logger.info("Job %s completed: %s", job_id, status)
+    return status
+
+
+if __name__ == "__main__":
+    log_config.setup_logging()
+
+    parser = argparse.ArgumentParser(description="Run the COVID-19 data pipeline as sharded worker processes")
+    parser.add_argument('command', choices=['run', 'worker', 'status'],
+                        help="run: queue and run a job, worker: add a worker to a job on this machine, status: show a job")
+    parser.add_argument('--job-id', help="job to resume, join or show")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--shard-by', choices=['batch', 'region'], default='batch')
+    parser.add_argument('--shard-size', type=int, default=BATCH_SIZE, help="countries per batch shard")
+    parser.add_argument('--mode', choices=['snapshot', 'timeseries'], default='snapshot')
+    parser.add_argument('--backfill-days', type=int, default=BACKFILL_DAYS)
+    parser.add_argument('--queue-file', default=work_queue.QUEUE_FILE)
+    parser.add_argument('--rate-share', type=float, default=1.0,
+                        help="share of the API rate limits for this worker, e.g. 0.25 with four workers")
+    parser.add_argument('--parquet-dir', help="also write a partitioned Parquet dataset to this directory")
+    parser.add_argument('--postgres-dsn', help="also bulk load into this PostgreSQL database")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run_job(COUNTRIES, workers=args.workers, shard_by=args.shard_by, shard_size=args.shard_size, mode=args.mode,
+                backfill_days=args.backfill_days, queue_file=args.queue_file, parquet_dir=args.parquet_dir,
+                postgres_dsn=args.postgres_dsn, job_id=args.job_id)
+    elif not args.job_id:
+        parser.error(f"{args.command} needs --job-id")
+    elif args.command == 'worker':
+        run_worker(args.job_id, queue_file=args.queue_file, rate_share=args.rate_share, parquet_dir=args.parquet_dir,
+                   postgres_dsn=args.postgres_dsn)
+    else:
+        for task in work_queue.job_results(args.job_id, args.queue_file):
+            print(task)